@@ -1,42 +1,353 @@
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import Response
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Query
+from fastapi.responses import Response, FileResponse, JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+from pymongo import monitoring
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError
+from typing import TYPE_CHECKING, List, Optional, Literal
 import uuid
 import base64
-from datetime import datetime, timezone
-from contextlib import asynccontextmanager
-import google.genai as genai
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Email, To, Content, MimeType
+import asyncio
+import csv
+import functools
+import hashlib
+import heapq
+import hmac
+import io
+import itertools
+import json
+import math
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone, timedelta
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import Context, ContextVar
+import httpx
+import orjson
+
+# google.genai (~0.4 s) and sendgrid are imported where first used, so a
+# cold start or worker spawn only pays for them if it generates an image
+# or delivers an email; Pillow is likewise imported by the transcoder
+if TYPE_CHECKING:
+    from sendgrid.helpers.mail import Mail
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Prometheus metrics, exposed at /metrics. Hot paths only observe histograms
+# and bump counters; cache and queue figures are read when /metrics is scraped.
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served", ["method"])
+REQUEST_BYTES = Counter("http_request_bytes_total", "HTTP request body bytes (from Content-Length)", ["route"])
+RESPONSE_BYTES = Counter("http_response_bytes_total", "HTTP response body bytes", ["route"])
+GEMINI_LATENCY = Histogram(
+    "gemini_generate_content_duration_seconds", "Gemini generate_content call latency",
+    buckets=(0.5, 1, 2, 4, 6, 8, 10, 15, 20, 30, 60, 120),
+)
+GEMINI_QUEUE_WAIT = Histogram(
+    "gemini_queue_wait_seconds", "Time image generations waited for a Gemini slot",
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 2, 5, 10, 20, 30, 60),
+)
+SENDGRID_LATENCY = Histogram("sendgrid_send_duration_seconds", "SendGrid mail/send call latency")
+MONGO_LATENCY = Histogram(
+    "mongo_operation_duration_seconds", "MongoDB command latency", ["collection", "operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+# Request tracing: stages wrapped in span() are timed into the current trace.
+# TracingMiddleware opens one per request, returned as a Server-Timing header
+# and logged as a JSON line on the "server.trace" logger; background jobs
+# open their own with traced().
+_current_trace: ContextVar[Optional[dict]] = ContextVar("current_trace", default=None)
+trace_logger = logging.getLogger(f"{__name__}.trace")
+
+
+@contextmanager
+def span(name: str):
+    """Time a stage into the current trace; repeated stages add up. A no-op outside a trace."""
+    spans = _current_trace.get()
+    if spans is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans[name] = spans.get(name, 0.0) + time.perf_counter() - started
+
+
+def _log_trace(event: str, spans: dict, duration: float, **fields):
+    trace_logger.info(orjson.dumps({
+        "event": event,
+        **fields,
+        "duration_ms": round(duration * 1000, 3),
+        "spans_ms": {name: round(seconds * 1000, 3) for name, seconds in spans.items()},
+    }).decode())
+
+
+@contextmanager
+def traced(event: str, **fields):
+    """Collect the spans of a background job and log them when it finishes"""
+    spans = {}
+    token = _current_trace.set(spans)
+    started = time.perf_counter()
+    try:
+        yield spans
+    finally:
+        _current_trace.reset(token)
+        _log_trace(event, spans, time.perf_counter() - started, **fields)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Feeds every MongoDB command's duration into MONGO_LATENCY"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        self._observe(event)
+
+    def failed(self, event):
+        self._observe(event)
+
+    def _observe(self, event):
+        collection = self._collections.pop(event.request_id, "")
+        MONGO_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+
+# MongoDB connection, created by the lifespan handler (see connect_mongo),
+# so importing this module never reads MONGO_URL or touches the network
+client = None
+db = None
+
+
+def connect_mongo():
+    """Create the Motor client and database handle, unless a database was already provided"""
+    global client, db
+    if db is None:
+        # tz_aware so stored datetimes come back as UTC-aware, comparable with datetime.now(timezone.utc)
+        client = AsyncIOMotorClient(
+            os.environ['MONGO_URL'], tz_aware=True, event_listeners=[MongoCommandMetrics()]
+        )
+        db = client[os.environ['DB_NAME']]
+    generated_images_cache.collection = db.generated_images
+    generated_images_cache.alias_collection = db.image_aliases
+    if status_write_buffer is not None:
+        status_write_buffer.collection = db.status_checks
+
+
+# Outbound API clients live for the whole process: each keeps a pool of
+# keep-alive connections, so requests skip client construction and TLS setup
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "20"))
+HTTP_POOL_KEEPALIVE_SECONDS = float(os.getenv("HTTP_POOL_KEEPALIVE_SECONDS", "30"))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "120"))
+SENDGRID_TIMEOUT_SECONDS = float(os.getenv("SENDGRID_TIMEOUT_SECONDS", "10"))
+SENDGRID_BASE_URL = os.getenv("SENDGRID_BASE_URL", "https://api.sendgrid.com")
+
+gemini_client = None
+sendgrid_client = None
+
+
+def _http_pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_POOL_MAX_CONNECTIONS,
+        keepalive_expiry=HTTP_POOL_KEEPALIVE_SECONDS,
+    )
+
+
+def get_gemini_client():
+    """Return the shared Gemini client, creating it on first use"""
+    global gemini_client
+    if gemini_client is None:
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise HTTPException(status_code=500, detail="GEMINI_API_KEY not configured")
+        from google import genai
+        from google.genai import types as genai_types
+        
+        gemini_client = genai.Client(
+            api_key=api_key,
+            http_options=genai_types.HttpOptions(
+                base_url=os.getenv("GEMINI_BASE_URL"),
+                timeout=int(GEMINI_TIMEOUT_SECONDS * 1000),  # milliseconds
+                async_client_args={"limits": _http_pool_limits()},
+            ),
+        )
+    return gemini_client
+
+
+def get_sendgrid_client() -> Optional[httpx.AsyncClient]:
+    """Return the shared SendGrid HTTP client, or None if no API key is configured"""
+    global sendgrid_client
+    if sendgrid_client is None:
+        api_key = os.getenv("SENDGRID_API_KEY")
+        if not api_key:
+            return None
+        sendgrid_client = httpx.AsyncClient(
+            base_url=SENDGRID_BASE_URL,
+            headers={"Authorization": f"Bearer {api_key}"},
+            limits=_http_pool_limits(),
+            timeout=SENDGRID_TIMEOUT_SECONDS,
+        )
+    return sendgrid_client
+
+
+async def close_api_clients():
+    global gemini_client, sendgrid_client
+    if gemini_client is not None:
+        await gemini_client.aio.aclose()
+        gemini_client = None
+    if sendgrid_client is not None:
+        await sendgrid_client.aclose()
+        sendgrid_client = None
+
+
+# Status checks older than this are removed by a Mongo TTL index; 0 keeps them forever
+STATUS_CHECK_TTL_SECONDS = int(os.getenv("STATUS_CHECK_TTL_SECONDS", "0"))
+STATUS_CHECK_TTL_INDEX = "timestamp_ttl"
+
+
+async def _ensure_status_check_ttl():
+    """Create, retune or drop the status_checks TTL index to match STATUS_CHECK_TTL_SECONDS"""
+    if not STATUS_CHECK_TTL_SECONDS:
+        try:
+            await db.status_checks.drop_index(STATUS_CHECK_TTL_INDEX)
+            logger.info("Dropped status_checks TTL index")
+        except OperationFailure:
+            pass  # Never existed
+        return
+    try:
+        await db.status_checks.create_index(
+            "timestamp", name=STATUS_CHECK_TTL_INDEX, expireAfterSeconds=STATUS_CHECK_TTL_SECONDS
+        )
+    except OperationFailure:
+        # Exists with a different expiry: change it in place rather than rebuilding
+        await db.command(
+            "collMod", "status_checks",
+            index={"name": STATUS_CHECK_TTL_INDEX, "expireAfterSeconds": STATUS_CHECK_TTL_SECONDS},
+        )
+
+
+async def ensure_indexes():
+    """Create every index the hot queries rely on; safe to run on each startup"""
+    # Image cache and alias lookups
+    await db.generated_images.create_index("key", unique=True)
+    await db.image_aliases.create_index("section_id", unique=True)
+    
+    # Keyset pagination of GET /status, lookups by client
+    await db.status_checks.create_index([("timestamp", 1), ("id", 1)])
+    await db.status_checks.create_index("client_name")
+    await _ensure_status_check_ttl()
+    
+    # Contact outbox claims, lead lookups by email and date-range queries
+    await db.contact_submissions.create_index([("delivery_status", 1), ("next_attempt_at", 1)])
+    await db.contact_submissions.create_index("email")
+    await db.contact_submissions.create_index("timestamp")
 
 
 # Lifespan context manager for startup/shutdown events
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: nothing needed here currently
+    # Startup: connect, then indexes first, so the queries below never fall back to collection scans
+    connect_mongo()
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.warning(f"Could not create MongoDB indexes: {str(e)}")
+    
+    if status_write_buffer is not None:
+        status_write_buffer.start()
+    
+    # Convert any legacy string timestamps before serving: the keyset queries
+    # and exports only handle native datetimes. Cheap once nothing is left.
+    for migrate in (migrate_status_check_timestamps, migrate_contact_submission_timestamps):
+        try:
+            await migrate()
+        except Exception as e:
+            logger.error(f"Timestamp migration {migrate.__name__} failed: {str(e)}")
+    
+    # Open the SendGrid pool up front. The Gemini client (and google.genai)
+    # is left to the first cache miss, which waits seconds on Gemini anyway.
+    get_sendgrid_client()
+    
+    # Deliver queued contact emails in the background
+    if CONTACT_DIGEST_ENABLED:
+        delivery_workers = [asyncio.create_task(contact_digest_worker())]
+    else:
+        delivery_workers = [
+            asyncio.create_task(contact_delivery_worker())
+            for _ in range(CONTACT_DELIVERY_CONCURRENCY)
+        ]
+    
+    # Warm the known section images in the background; /api/ready reports progress
+    manifest = load_prewarm_manifest()
+    prewarm_task = None
+    if os.getenv("IMAGE_PREWARM_ENABLED", "true").lower() == "true":
+        prewarm_task = asyncio.create_task(prewarm_images(manifest))
+    else:
+        prewarm_status.update(total=0, warmed=0, failed=[], done=True)
+    
+    # Regenerate them off-peak before they expire, so visitors rarely see an expired one
+    refresh_task = None
+    if generated_images_cache.ttl_seconds > 0 and os.getenv("IMAGE_REFRESH_ENABLED", "true").lower() == "true":
+        refresh_task = asyncio.create_task(image_refresh_scheduler(manifest))
+    
     yield
-    # Shutdown: close MongoDB connection
-    client.close()
+    
+    # Shutdown: stop background work, then close MongoDB connection.
+    # Submissions mid-delivery keep their lease and are retried after restart.
+    if prewarm_task is not None:
+        prewarm_task.cancel()
+    if refresh_task is not None:
+        refresh_task.cancel()
+    for worker in delivery_workers:
+        worker.cancel()
+    await asyncio.gather(*delivery_workers, return_exceptions=True)
+    if status_write_buffer is not None:
+        await status_write_buffer.close()
+    await close_api_clients()
+    if client is not None:
+        client.close()
 
 
-# Create the main app with lifespan handler
-app = FastAPI(lifespan=lifespan)
+class FastJSONResponse(ORJSONResponse):
+    """orjson-rendered JSON, with UTC datetimes in the same 'Z' form pydantic emits"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+def _ndjson_line(content) -> bytes:
+    return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_APPEND_NEWLINE)
+
+
+# Create the main app with lifespan handler. Routes returning trusted data
+# (from Mongo or the image cache) return FastJSONResponse directly, which
+# skips response_model re-validation; response_model still documents them.
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -58,43 +369,521 @@ class StatusCheckCreate(BaseModel):
 async def root():
     return {"message": "Hello World"}
 
+class StatusWriteBuffer:
+    """Write-behind buffer that groups single status check inserts into insert_many calls.
+
+    A batch is flushed when it reaches max_batch documents or max_delay seconds
+    after its first document, whichever comes first. add() waits while
+    max_pending documents are already queued, pushing back on callers instead
+    of growing without bound. Documents are acknowledged before they are
+    written, so a crash can lose up to one buffer's worth.
+    """
+
+    def __init__(self, collection, max_batch: int, max_delay: float, max_pending: int):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.flushes = 0
+        self.written = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def add(self, doc: dict):
+        await self.queue.put(doc)
+
+    async def close(self):
+        """Flush everything queued so far and stop the flusher"""
+        await self.queue.put(None)
+        await self._task
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            doc = await self.queue.get()
+            if doc is None:
+                return
+            batch = [doc]
+            deadline = loop.time() + self.max_delay
+            closing = False
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    doc = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if doc is None:
+                    closing = True
+                    break
+                batch.append(doc)
+            await self._flush(batch)
+            if closing:
+                return
+
+    async def _flush(self, batch: List[dict]):
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} buffered status checks: {str(e)}")
+        self.flushes += 1
+
+
+# Opt-in write-behind for POST /status; connected, started and flushed by the lifespan handler
+status_write_buffer = None
+if os.getenv("STATUS_WRITE_BEHIND_ENABLED", "false").lower() == "true":
+    status_write_buffer = StatusWriteBuffer(
+        None,
+        max_batch=int(os.getenv("STATUS_WRITE_BATCH_SIZE", "500")),
+        max_delay=float(os.getenv("STATUS_WRITE_MAX_DELAY_SECONDS", "0.05")),
+        max_pending=int(os.getenv("STATUS_WRITE_MAX_PENDING", "10000")),
+    )
+
+
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.model_dump()
     status_obj = StatusCheck(**status_dict)
     
-    # Convert to dict and serialize datetime to ISO string for MongoDB
+    # Timestamps are stored as native BSON datetimes so they sort and range-query correctly
     doc = status_obj.model_dump()
-    doc['timestamp'] = doc['timestamp'].isoformat()
     
-    _ = await db.status_checks.insert_one(doc)
+    if status_write_buffer is not None:
+        await status_write_buffer.add(doc)
+    else:
+        _ = await db.status_checks.insert_one(doc)
     return status_obj
 
+
+@api_router.post("/status/batch", response_model=List[StatusCheck])
+async def create_status_checks(inputs: List[StatusCheckCreate]):
+    """Insert many status checks in one round trip"""
+    if len(inputs) > 1000:
+        raise HTTPException(status_code=413, detail="At most 1000 status checks per batch")
+    status_objs = [StatusCheck(**input.model_dump()) for input in inputs]
+    if status_objs:
+        await db.status_checks.insert_many([obj.model_dump() for obj in status_objs], ordered=False)
+    return status_objs
+
+
+def _encode_status_cursor(check: dict) -> str:
+    raw = f"{check['timestamp'].isoformat()}|{check['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_status_cursor(cursor: str) -> dict:
+    """Turn an opaque cursor into the keyset filter for rows after it"""
+    try:
+        timestamp, check_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        timestamp = datetime.fromisoformat(timestamp)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"$or": [
+        {"timestamp": {"$gt": timestamp}},
+        {"timestamp": timestamp, "id": {"$gt": check_id}},
+    ]}
+
+
+# Only the StatusCheck fields, so rows can be returned without re-validation
+STATUS_CHECK_PROJECTION = {"_id": 0, "id": 1, "client_name": 1, "timestamp": 1}
+
+
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    # Exclude MongoDB's _id field from the query results
-    status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
+async def get_status_checks(
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    """List status checks oldest first, paginated by (timestamp, id).
+
+    Pass the X-Next-Cursor header of one page as ?after= to get the next.
+    format=ndjson streams every row after the cursor straight off the Mongo
+    cursor instead of building a page in memory.
+    """
+    # Only native datetimes: a legacy timestamp the migration couldn't parse
+    # has no place in the (timestamp, id) order, and would break the cursor
+    query = {"timestamp": {"$type": "date"}, **(_decode_status_cursor(after) if after else {})}
+    cursor = db.status_checks.find(query, STATUS_CHECK_PROJECTION).sort([("timestamp", 1), ("id", 1)])
     
-    # Convert ISO string timestamps back to datetime objects
-    for check in status_checks:
-        if isinstance(check['timestamp'], str):
-            check['timestamp'] = datetime.fromisoformat(check['timestamp'])
+    if format == "ndjson":
+        async def stream():
+            async for check in cursor.batch_size(500):
+                yield _ndjson_line(check)
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
     
-    return status_checks
+    # Fetch one extra row to learn whether there is a next page
+    status_checks = await cursor.limit(limit + 1).to_list(limit + 1)
+    headers = {}
+    if len(status_checks) > limit:
+        status_checks = status_checks[:limit]
+        headers["X-Next-Cursor"] = _encode_status_cursor(status_checks[-1])
+    
+    return FastJSONResponse(status_checks, headers=headers)
+
+
+async def _migrate_string_timestamps(collection) -> int:
+    """Convert legacy ISO-string timestamps in a collection to native datetimes"""
+    migrated = 0
+    async for doc in collection.find({"timestamp": {"$type": "string"}}, {"_id": 1, "timestamp": 1}):
+        try:
+            timestamp = datetime.fromisoformat(doc["timestamp"])
+        except ValueError:
+            logger.warning(f"Skipping document {doc['_id']} with unparseable timestamp {doc['timestamp']!r}")
+            continue
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        await collection.update_one({"_id": doc["_id"]}, {"$set": {"timestamp": timestamp}})
+        migrated += 1
+    return migrated
+
+
+async def migrate_status_check_timestamps() -> int:
+    """Convert legacy ISO-string timestamps in status_checks to native datetimes.
+
+    Documents written before timestamps were stored natively are invisible to
+    the keyset queries above (Mongo never compares strings with dates), so this
+    runs at startup; it is idempotent and cheap once nothing is left to convert.
+    """
+    migrated = await _migrate_string_timestamps(db.status_checks)
+    if migrated:
+        logger.info(f"Migrated {migrated} status check timestamps to native datetimes")
+    return migrated
+
 
 # Image Generation Models
 class ImageGenerationRequest(BaseModel):
     prompt: str
     section_id: str  # Unique identifier for caching
+    # "url" returns a cacheable image URL instead of the inline base64 blob
+    response_format: Literal["base64", "url"] = "base64"
 
 
 class ImageGenerationResponse(BaseModel):
-    image_data: str  # Base64 encoded image
     section_id: str
+    image_data: Optional[str] = None  # Base64 encoded image
+    image_url: Optional[str] = None  # Content-hashed, immutable image URL
+    stale: Optional[bool] = None  # True when generation failed and an older image was returned
+
+
+# Cache policies for /api/generated-image: content-hashed URLs never change,
+# while the bare section URL must be revalidated (cheaply, via ETag) each time
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+_DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Responsive variants transcoded from each generated PNG, best format first
+IMAGE_VARIANT_WIDTHS = sorted(
+    int(width) for width in os.getenv("IMAGE_VARIANT_WIDTHS", "640,1280,1920").split(",")
+)
+IMAGE_VARIANT_FORMATS = {"avif": "image/avif", "webp": "image/webp"}
+
+
+class ImageBlobStore:
+    """Content-addressed on-disk store of raw image bytes.
+
+    Blobs live at <root>/<digest[:2]>/<digest>.png, so identical images are
+    stored once and a path never changes content once written. Resized
+    variants of a blob sit next to it under <root>/<digest[:2]>/<digest>/.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.png"
+
+    def variant_path(self, digest: str, width: int, fmt: str) -> Path:
+        return self.root / digest[:2] / digest / f"{width}.{fmt}"
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).is_file()
+
+    def put(self, data: bytes) -> str:
+        """Write a blob (atomically, if not already present) and return its digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not path.is_file():
+            self._write(path, data)
+        return digest
+
+    def put_variant(self, digest: str, width: int, fmt: str, data: bytes):
+        self._write(self.variant_path(digest, width, fmt), data)
+
+    def read(self, digest: str) -> bytes:
+        return self.path(digest).read_bytes()
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
 
 
-# Store generated images in memory cache
-generated_images_cache = {}
+@dataclass
+class CachedImage:
+    digest: str
+    size: int
+    data: Optional[bytes] = None  # Raw PNG bytes, when loaded into memory
+    stale: bool = False  # An older image for the section, served because generation failed
+    expires_at: Optional[datetime] = None  # When to regenerate it; None never expires
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and self.expires_at <= datetime.now(timezone.utc)
+
+
+class ImageCache:
+    """Tiered cache for generated images.
+
+    Entries are keyed by a hash of the model and enhanced prompt (see
+    _image_cache_key), so identical prompts share one image and a prompt
+    edit is simply a new key. Section ids are aliases pointing at the key
+    currently in use for that section.
+
+    Raw PNG bytes are written to a content-addressed blob store on local disk,
+    which the image route serves straight from. An in-process LRU bounded by
+    a byte budget keeps recently used bytes in memory for the JSON shape, and
+    Mongo collections shared by every worker map keys to digests (holding a
+    copy of the bytes) and section ids to keys, so images survive restarts
+    and deploys.
+
+    Each entry records when it expires, ttl_seconds after it was written
+    (0 keeps entries forever). Expired entries are still returned, so
+    callers can serve them while a replacement is generated; set() swaps
+    the replacement in under the same key. An expired entry is re-checked
+    against the shared store (for another worker's refresh) at most once
+    per recheck_seconds, so expired hits stay as cheap as fresh ones.
+    """
+
+    def __init__(
+        self, max_bytes: int, blob_store: ImageBlobStore, collection=None, alias_collection=None,
+        ttl_seconds: float = 0, recheck_seconds: float = 30, alias_ttl_seconds: float = 5,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.recheck_seconds = recheck_seconds
+        self.alias_ttl_seconds = alias_ttl_seconds
+        self._rechecked = {}  # key -> monotonic time an expired entry was last re-checked
+        self.blob_store = blob_store
+        self.collection = collection
+        self.alias_collection = alias_collection
+        self._aliases = {}  # section id -> (key, monotonic time it was read or written)
+        self._entries = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired_hits = 0
+
+    async def get(self, key: str, with_data: bool = True) -> Optional[CachedImage]:
+        """Look up an image by cache key, checking memory, then local disk and the shared store.
+
+        With with_data=False only the digest is needed (to serve the blob from
+        disk), so the bytes are not read into memory.
+        """
+        image = self._entries.get(key)
+        if image is not None and image.expired():
+            # Another worker may have refreshed it already
+            now = time.monotonic()
+            if now - self._rechecked.get(key, -math.inf) >= self.recheck_seconds:
+                self._rechecked[key] = now
+                fresher = await self._load(key, with_data)
+                if fresher is not None and not fresher.expired():
+                    self._forget(key)
+                    self.store_hits += 1
+                    if fresher.data is not None:
+                        self._remember(key, fresher)
+                    return fresher
+            self.expired_hits += 1
+        if image is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return image
+        
+        image = await self._load(key, with_data)
+        if image is None:
+            self.misses += 1
+            return None
+        
+        self.store_hits += 1
+        if image.data is not None:
+            self._remember(key, image)
+        return image
+
+    async def _load(self, key: str, with_data: bool) -> Optional[CachedImage]:
+        if self.collection is None:
+            return None
+        try:
+            doc = await self.collection.find_one(
+                {"key": key}, {"_id": 0, "digest": 1, "size": 1, "expires_at": 1}
+            )
+            if not doc or "digest" not in doc:
+                return None
+            digest = doc["digest"]
+            expires_at = doc.get("expires_at")
+            
+            if await asyncio.to_thread(self.blob_store.exists, digest):
+                data = await asyncio.to_thread(self.blob_store.read, digest) if with_data else None
+                return CachedImage(digest=digest, size=doc["size"], data=data, expires_at=expires_at)
+            
+            # Another worker generated it: copy the bytes down to local disk
+            doc = await self.collection.find_one({"key": key}, {"_id": 0, "data": 1})
+            if not doc or not doc.get("data"):
+                return None
+            data = bytes(doc["data"])
+            await asyncio.to_thread(self.blob_store.put, data)
+            return CachedImage(digest=digest, size=len(data), data=data, expires_at=expires_at)
+        except Exception as e:
+            logger.warning(f"Image store lookup failed for {key}: {str(e)}")
+            return None
+
+    async def set(self, key: str, data: bytes) -> CachedImage:
+        """Write image bytes to disk, cache them in memory and persist to the shared store.
+
+        Replacing an existing key is atomic for readers: the new blob is
+        written under its own digest first, then the memory entry and the
+        store document each switch over in a single step. The old blob stays
+        on disk, so URLs already handed out for it keep working.
+        """
+        digest = await asyncio.to_thread(self.blob_store.put, data)
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.ttl_seconds) if self.ttl_seconds > 0 else None
+        image = CachedImage(digest=digest, size=len(data), data=data, expires_at=expires_at)
+        self._remember(key, image)
+        if self.collection is None:
+            return image
+        try:
+            await self.collection.update_one(
+                {"key": key},
+                {"$set": {
+                    "digest": digest,
+                    "size": len(data),
+                    "data": data,
+                    "updated_at": now,
+                    "expires_at": expires_at,
+                }},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning(f"Image store write failed for {key}: {str(e)}")
+        return image
+
+    def _memoized_alias(self, section_id: str) -> Optional[str]:
+        """The memoized key for a section, unless another worker may have moved it since"""
+        memo = self._aliases.get(section_id)
+        if memo is None:
+            return None
+        key, noted_at = memo
+        if self.alias_collection is not None and time.monotonic() - noted_at >= self.alias_ttl_seconds:
+            return None
+        return key
+
+    async def resolve_alias(self, section_id: str) -> Optional[str]:
+        """Return the cache key a section id currently points at.
+
+        Lookups are memoized for alias_ttl_seconds, so a prompt edit made by
+        another worker is picked up within that long.
+        """
+        key = self._memoized_alias(section_id)
+        if key is not None or self.alias_collection is None:
+            return key
+        try:
+            doc = await self.alias_collection.find_one({"section_id": section_id}, {"_id": 0, "key": 1})
+        except Exception as e:
+            logger.warning(f"Image alias lookup failed for {section_id}: {str(e)}")
+            return None
+        if not doc:
+            self._aliases.pop(section_id, None)
+            return None
+        self._aliases[section_id] = (doc["key"], time.monotonic())
+        return doc["key"]
+
+    async def set_alias(self, section_id: str, key: str):
+        """Point a section id at a cache key, persisting only when it changed"""
+        if self._memoized_alias(section_id) == key:
+            return
+        self._aliases[section_id] = (key, time.monotonic())
+        if self.alias_collection is None:
+            return
+        try:
+            await self.alias_collection.update_one(
+                {"section_id": section_id},
+                {"$set": {"key": key, "updated_at": datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning(f"Image alias write failed for {section_id}: {str(e)}")
+
+    async def reload(self, key: str) -> Optional[CachedImage]:
+        """Re-read an entry from the shared store, which may have been refreshed by another worker"""
+        if self.collection is None:
+            return self._entries.get(key)
+        image = await self._load(key, with_data=False)
+        if image is not None and image.digest != getattr(self._entries.get(key), "digest", None):
+            self._forget(key)
+        return image
+
+    def _forget(self, key: str):
+        self._rechecked.pop(key, None)
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size_bytes -= previous.size
+
+    def _remember(self, key: str, image: CachedImage):
+        self._forget(key)
+        
+        # Images larger than the whole budget are only kept on disk
+        if image.size > self.max_bytes:
+            return
+        
+        self._entries[key] = image
+        self.size_bytes += image.size
+        while self.size_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size_bytes -= evicted.size
+            self.evictions += 1
+
+    def clear(self):
+        """Drop the in-memory tier; disk and the shared store are left untouched"""
+        self._entries.clear()
+        self._rechecked.clear()
+        self._aliases.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired_hits": self.expired_hits,
+            "entries": len(self._entries),
+            "aliases": len(self._aliases),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Generated images: in-memory LRU over an on-disk blob store and the shared
+# Mongo store (whose collections connect_mongo fills in at startup)
+generated_images_cache = ImageCache(
+    max_bytes=int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    blob_store=ImageBlobStore(os.getenv("IMAGE_STORE_DIR", str(ROOT_DIR / "image_store"))),
+    ttl_seconds=float(os.getenv("IMAGE_TTL_SECONDS", str(7 * 24 * 3600))),
+    recheck_seconds=float(os.getenv("IMAGE_EXPIRED_RECHECK_SECONDS", "30")),
+    alias_ttl_seconds=float(os.getenv("IMAGE_ALIAS_TTL_SECONDS", "5")),
+)
 
 # Configure logging
 logging.basicConfig(
@@ -104,29 +893,14 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-@api_router.post("/generate-image", response_model=ImageGenerationResponse)
-async def generate_image(request: ImageGenerationRequest):
-    """Generate a cinematic image using Google Gemini"""
-    try:
-        # Check cache first
-        if request.section_id in generated_images_cache:
-            logger.info(f"Returning cached image for section: {request.section_id}")
-            return ImageGenerationResponse(
-                image_data=generated_images_cache[request.section_id],
-                section_id=request.section_id
-            )
-        
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise HTTPException(status_code=500, detail="GEMINI_API_KEY not configured")
-        
-        # Configure new Gemini API client
-        client_genai = genai.Client(api_key=api_key)
-        
-        # Enhanced cinematic prompt
-        enhanced_prompt = f"""Create a stunning, cinematic, high-resolution image for a professional business website background.
+GEMINI_IMAGE_MODEL = 'gemini-2.5-flash-image'
+
+
+def _build_enhanced_prompt(prompt: str) -> str:
+    """Wrap a section theme in the cinematic style brief sent to Gemini"""
+    return f"""Create a stunning, cinematic, high-resolution image for a professional business website background.
         
-Theme: {request.prompt}
+Theme: {prompt}
 
 Style requirements:
 - Ultra high quality, 4K resolution feel
@@ -138,14 +912,282 @@ Style requirements:
 - Suitable for a web agency/design studio website
 
 The image should evoke professionalism, creativity, and innovation."""
+
+
+def _image_cache_key(enhanced_prompt: str, model: str = GEMINI_IMAGE_MODEL) -> str:
+    """Content-addressed cache key: identical prompts share an image, edits get a new one"""
+    return hashlib.sha256(f"{model}\n{enhanced_prompt}".encode("utf-8")).hexdigest()
+
+
+class UnavailableError(HTTPException):
+    """503 with a machine-readable code, so the frontend can choose between a
+    fallback image ("provider_unavailable") and a retry ("at_capacity")"""
+
+    def __init__(self, code: str, detail: str, retry_after: int):
+        super().__init__(status_code=503, detail=detail, headers={"Retry-After": str(retry_after)})
+        self.code = code
+
+
+@app.exception_handler(UnavailableError)
+async def unavailable_error_handler(request: Request, exc: UnavailableError):
+    return FastJSONResponse({"detail": exc.detail, "code": exc.code}, status_code=exc.status_code, headers=exc.headers)
+
+
+# In-flight generations keyed by cache key, so concurrent cache misses for the
+# same prompt share a single Gemini call (and its result or error)
+_inflight_generations = {}
+
+
+class GenerationScheduler:
+    """Caps concurrent Gemini calls and starts queued ones in priority order.
+
+    Lower priority numbers go first; equal priorities are first come, first
+    served. When max_queue generations are already waiting, slot() fails
+    fast with a 503 and Retry-After instead of letting work pile up.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, retry_after: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.active = 0
+        self.rejected = 0
+        self._waiters = []  # heap of [priority, sequence, future]
+        self._sequence = itertools.count()
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: int):
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            GEMINI_QUEUE_WAIT.observe(0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise UnavailableError(
+                "at_capacity", "Image generation is at capacity, please retry shortly", self.retry_after
+            )
         
-        logger.info(f"Generating image for section: {request.section_id}")
-        
-        # Use new API with gemini-2.5-flash-image model
-        response = client_genai.models.generate_content(
-            model='gemini-2.5-flash-image',
-            contents=enhanced_prompt
+        entry = [priority, next(self._sequence), asyncio.get_running_loop().create_future()]
+        heapq.heappush(self._waiters, entry)
+        started = time.perf_counter()
+        try:
+            with span("queue"):
+                await entry[2]
+        except asyncio.CancelledError:
+            if entry[2].done() and not entry[2].cancelled():
+                # The slot was handed over just before the cancellation; pass it on
+                self._release()
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+        GEMINI_QUEUE_WAIT.observe(time.perf_counter() - started)
+
+    def _release(self):
+        # Hand the slot straight to the most urgent waiter, if there is one
+        while self._waiters:
+            future = heapq.heappop(self._waiters)[2]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+gemini_scheduler = GenerationScheduler(
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+    max_queue=int(os.getenv("GEMINI_MAX_QUEUE", "32")),
+    retry_after=int(os.getenv("GEMINI_RETRY_AFTER_SECONDS", "10")),
+)
+
+# Sections in landing-page order: above-the-fold images are generated first
+IMAGE_SECTION_PRIORITY = [
+    section.strip() for section in os.getenv("IMAGE_SECTION_PRIORITY", "services,portfolio,benefits").split(",")
+]
+
+
+def _section_priority(section_id: str) -> int:
+    """Queue priority for a section's generation; unlisted sections go last"""
+    try:
+        return IMAGE_SECTION_PRIORITY.index(section_id)
+    except ValueError:
+        return len(IMAGE_SECTION_PRIORITY)
+
+
+def _refresh_priority(section_id: str) -> int:
+    """Queue priority for regenerating an expired image: behind every visitor-facing miss"""
+    return len(IMAGE_SECTION_PRIORITY) + 1 + _section_priority(section_id)
+
+
+class CircuitBreaker:
+    """Stops calling a failing dependency for a while, then probes it.
+
+    Closed: calls go through, and failure_threshold failures in a row open
+    the breaker. Open: calls are refused for reset_timeout seconds. Half
+    open: a single probe call goes through; success closes the breaker and
+    failure opens it for another reset_timeout.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opens = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def accepting(self) -> bool:
+        """Whether a call would be let through right now (without claiming the probe)"""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return time.monotonic() - self._opened_at >= self.reset_timeout
+        return not self._probing
+
+    def retry_after(self) -> int:
+        remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+        return max(1, math.ceil(remaining))
+
+    def unavailable(self) -> UnavailableError:
+        return UnavailableError(
+            "provider_unavailable", "Image generation is temporarily unavailable", self.retry_after()
         )
+
+    @contextmanager
+    def protect(self):
+        """Run one call through the breaker, raising 503 if it is refused"""
+        if not self.accepting:
+            raise self.unavailable()
+        if self.state == "open":
+            self.state = "half_open"
+        if self.state == "half_open":
+            self._probing = True
+        try:
+            yield
+        except Exception:
+            self._record_failure()
+            raise
+        except BaseException:
+            # Cancelled: no verdict, let another call probe
+            self._probing = False
+            raise
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def _record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opens += 1
+                logger.warning(f"Gemini circuit breaker opened after {self.failures} failures")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+
+# Deadline for one whole Gemini call, retries included; failures and
+# timeouts feed the breaker, which fails cache misses fast while open
+GEMINI_DEADLINE_SECONDS = float(os.getenv("GEMINI_DEADLINE_SECONDS", "60"))
+gemini_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30")),
+)
+
+
+# Digests with a variant build running, and ones Pillow could not decode
+_variant_builds = set()
+_unconvertible_digests = set()
+
+
+@functools.lru_cache(maxsize=None)
+def _encodable_variant_formats() -> tuple:
+    """Variant formats this Pillow build can encode, best first"""
+    from PIL import features
+    
+    return tuple(fmt for fmt in IMAGE_VARIANT_FORMATS if features.check(fmt))
+
+
+def _transcode_variants(blob_store: ImageBlobStore, digest: str):
+    """Write every configured width of a blob in each supported format (CPU-bound)"""
+    from io import BytesIO
+    from PIL import Image
+    
+    formats = _encodable_variant_formats()
+    with Image.open(blob_store.path(digest)) as original:
+        original.load()
+        if original.mode not in ("RGB", "RGBA"):
+            original = original.convert("RGB")
+        for width in IMAGE_VARIANT_WIDTHS:
+            resized = original.copy()
+            # thumbnail() keeps the aspect ratio and never upscales
+            resized.thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+            for fmt in formats:
+                buffer = BytesIO()
+                resized.save(buffer, format=fmt.upper(), quality=60 if fmt == "avif" else 80)
+                blob_store.put_variant(digest, width, fmt, buffer.getvalue())
+
+
+def _schedule_variant_build(digest: str):
+    """Transcode a blob's variants in the background, once per digest"""
+    if digest in _variant_builds or digest in _unconvertible_digests:
+        return
+    _variant_builds.add(digest)
+    blob_store = generated_images_cache.blob_store
+    task = asyncio.create_task(asyncio.to_thread(_transcode_variants, blob_store, digest))
+    
+    def _finished(task: asyncio.Task):
+        _variant_builds.discard(digest)
+        if not task.cancelled() and task.exception() is not None:
+            _unconvertible_digests.add(digest)
+            logger.warning(f"Could not build image variants for {digest}: {str(task.exception())}")
+    
+    task.add_done_callback(_finished)
+
+
+def _forget_generation(key: str, task: asyncio.Task):
+    """Drop a finished generation from the in-flight table"""
+    if _inflight_generations.get(key) is task:
+        del _inflight_generations[key]
+    # Mark the exception as retrieved in case every waiter went away
+    if not task.cancelled():
+        task.exception()
+
+
+async def _generate_image(
+    key: str, enhanced_prompt: str, section_id: str, priority: Optional[int] = None
+) -> CachedImage:
+    """Call Gemini for an image and cache its raw bytes under the prompt's key"""
+    if priority is None:
+        priority = _section_priority(section_id)
+    try:
+        client_genai = get_gemini_client()
+        
+        logger.info(f"Generating image for section: {section_id}")
+        
+        # Use the async API so the event loop keeps serving other
+        # requests during the multi-second generation. The scheduler caps
+        # how many run at once and orders the rest by section priority.
+        async with gemini_scheduler.slot(priority):
+            with gemini_breaker.protect():
+                async with asyncio.timeout(GEMINI_DEADLINE_SECONDS):
+                    with GEMINI_LATENCY.time(), span("gemini"):
+                        response = await client_genai.aio.models.generate_content(
+                            model=GEMINI_IMAGE_MODEL,
+                            contents=enhanced_prompt
+                        )
         
         # Check if response contains images
         if not response.candidates or not response.candidates[0].content.parts:
@@ -161,36 +1203,495 @@ The image should evoke professionalism, creativity, and innovation."""
         if not image_part or not image_part.inline_data.data:
             raise HTTPException(status_code=500, detail="No image data in response")
         
-        # Encode image to base64
-        image_data = base64.b64encode(image_part.inline_data.data).decode('utf-8')
+        # Cache the raw bytes; base64 is only produced for JSON responses
+        with span("store"):
+            image = await generated_images_cache.set(key, image_part.inline_data.data)
         
-        # Cache the result
-        generated_images_cache[request.section_id] = image_data
+        logger.info(f"Successfully generated image for section: {section_id}")
+        _schedule_variant_build(image.digest)
         
-        logger.info(f"Successfully generated image for section: {request.section_id}")
-        
-        return ImageGenerationResponse(
-            image_data=image_data,
-            section_id=request.section_id
-        )
+        return image
         
     except HTTPException:
         raise
+    except TimeoutError:
+        logger.error(f"Image generation for section {section_id} timed out")
+        raise HTTPException(status_code=504, detail=f"Image generation timed out after {GEMINI_DEADLINE_SECONDS:g}s")
     except Exception as e:
         logger.error(f"Error generating image: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Image generation failed: {str(e)}")
 
 
+def _image_url(section_id: str, digest: str) -> str:
+    return f"/api/generated-image/{section_id}?v={digest}"
+
+
+def _image_generation_payload(request: ImageGenerationRequest, image: CachedImage) -> dict:
+    """ImageGenerationResponse as a plain dict, ready for orjson without re-validation"""
+    if request.response_format == "url":
+        payload = {"section_id": request.section_id, "image_url": _image_url(request.section_id, image.digest)}
+    else:
+        with span("encode"):
+            payload = {"section_id": request.section_id, "image_data": base64.b64encode(image.data).decode('ascii')}
+    if image.stale:
+        payload["stale"] = True
+    return payload
+
+
+async def _limited(limiter: asyncio.Semaphore, coro):
+    async with limiter:
+        return await coro
+
+
+def _start_generation(
+    key: str, enhanced_prompt: str, section_id: str, priority: Optional[int] = None,
+    limiter: Optional[asyncio.Semaphore] = None, context: Optional[Context] = None,
+) -> asyncio.Task:
+    """Start a generation and register it in the in-flight table"""
+    generation = _generate_image(key, enhanced_prompt, section_id, priority)
+    task = asyncio.create_task(_limited(limiter, generation) if limiter else generation, context=context)
+    _inflight_generations[key] = task
+    task.add_done_callback(lambda t: _forget_generation(key, t))
+    return task
+
+
+# Keys whose last background refresh failed, and when. Failures such as an
+# empty (safety-filtered) response don't trip the circuit breaker, so each
+# key waits IMAGE_REFRESH_RETRY_SECONDS before it is tried again.
+_failed_refreshes = {}
+IMAGE_REFRESH_RETRY_SECONDS = float(os.getenv("IMAGE_REFRESH_RETRY_SECONDS", "300"))
+
+
+def _refresh_in_background(section_id: str, key: str, enhanced_prompt: str):
+    """Regenerate an expired image while the current one keeps being served"""
+    if key in _inflight_generations or not gemini_breaker.accepting:
+        return
+    failed_at = _failed_refreshes.get(key)
+    if failed_at is not None and time.monotonic() - failed_at < IMAGE_REFRESH_RETRY_SECONDS:
+        return
+    logger.info(f"Refreshing expired image for section: {section_id}")
+    # A fresh context, so the refresh isn't traced as part of this request
+    task = _start_generation(
+        key, enhanced_prompt, section_id, priority=_refresh_priority(section_id), context=Context()
+    )
+    
+    def _finished(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            _failed_refreshes[key] = time.monotonic()
+            error = task.exception()
+            detail = error.detail if isinstance(error, HTTPException) else str(error)
+            logger.warning(f"Refresh failed for section {section_id}, keeping the expired image: {detail}")
+        else:
+            _failed_refreshes.pop(key, None)
+    
+    task.add_done_callback(_finished)
+
+
+async def _get_or_generate_image(
+    section_id: str, prompt: str, with_data: bool = True, limiter: Optional[asyncio.Semaphore] = None
+) -> CachedImage:
+    """Return the cached image for a prompt, generating it on a miss.
+
+    A limiter, when given, caps how many new generations the caller starts;
+    cache hits and joins of in-flight generations never wait on it. An
+    expired image is still returned straight away, and regenerated in the
+    background (stale-while-revalidate).
+    """
+    with span("prompt"):
+        enhanced_prompt = _build_enhanced_prompt(prompt)
+        key = _image_cache_key(enhanced_prompt)
+    
+    with span("cache"):
+        cached_image = await generated_images_cache.get(key, with_data=with_data)
+    if cached_image is not None:
+        logger.info(f"Returning cached image for section: {section_id}")
+        await generated_images_cache.set_alias(section_id, key)
+        if cached_image.expired():
+            _refresh_in_background(section_id, key, enhanced_prompt)
+        return cached_image
+    
+    try:
+        # Single-flight: the first miss starts the generation, later ones await it
+        task = _inflight_generations.get(key)
+        if task is None:
+            if not gemini_breaker.accepting:
+                raise gemini_breaker.unavailable()
+            task = _start_generation(key, enhanced_prompt, section_id, limiter=limiter)
+        else:
+            logger.info(f"Awaiting in-flight generation for section: {section_id}")
+        
+        # Shield so a disconnecting client doesn't cancel the shared generation
+        with span("generation"):
+            image = await asyncio.shield(task)
+    except HTTPException:
+        # The section's previous image (from an older prompt) beats an error
+        stale_image = await _stale_section_image(section_id, key, with_data)
+        if stale_image is None:
+            raise
+        logger.warning(f"Generation failed, serving the previous image for section: {section_id}")
+        return stale_image
+    
+    await generated_images_cache.set_alias(section_id, key)
+    return image
+
+
+async def _stale_section_image(section_id: str, key: str, with_data: bool) -> Optional[CachedImage]:
+    """The image a section pointed at before this prompt, if it is still stored"""
+    stale_key = await generated_images_cache.resolve_alias(section_id)
+    if stale_key is None or stale_key == key:
+        return None
+    image = await generated_images_cache.get(stale_key, with_data=with_data)
+    return replace(image, stale=True) if image is not None else None
+
+
+@api_router.post("/generate-image", response_model=ImageGenerationResponse, response_model_exclude_none=True)
+async def generate_image(request: ImageGenerationRequest):
+    """Generate a cinematic image using Google Gemini"""
+    # The URL shape only needs the digest, not the bytes
+    image = await _get_or_generate_image(
+        request.section_id, request.prompt, with_data=request.response_format == "base64"
+    )
+    payload = _image_generation_payload(request, image)
+    with span("serialize"):
+        return FastJSONResponse(payload)
+
+
+@api_router.post("/generate-images")
+async def generate_images(requests: List[ImageGenerationRequest]):
+    """Generate several images, streaming each result as an NDJSON line as soon as it is ready.
+
+    Cache hits come back immediately; misses are generated concurrently, at
+    most IMAGE_BATCH_CONCURRENCY at a time. A failed item produces a line with
+    "error" and "status_code" instead of failing the whole batch.
+    """
+    max_items = int(os.getenv("IMAGE_BATCH_MAX_ITEMS", "20"))
+    if len(requests) > max_items:
+        raise HTTPException(status_code=413, detail=f"At most {max_items} images per batch")
+    limiter = asyncio.Semaphore(int(os.getenv("IMAGE_BATCH_CONCURRENCY", "3")))
+    
+    async def resolve(request: ImageGenerationRequest) -> bytes:
+        try:
+            image = await _get_or_generate_image(
+                request.section_id,
+                request.prompt,
+                with_data=request.response_format == "base64",
+                limiter=limiter,
+            )
+            return _ndjson_line(_image_generation_payload(request, image))
+        except HTTPException as e:
+            line = {"section_id": request.section_id, "error": e.detail, "status_code": e.status_code}
+            if isinstance(e, UnavailableError):
+                line["code"] = e.code
+            return _ndjson_line(line)
+    
+    async def stream():
+        tasks = [asyncio.create_task(resolve(request)) for request in requests]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            # Client went away: stop waiting (shared generations carry on)
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+# Section images warmed at startup; mirrors the FullScreenSections on the landing page
+DEFAULT_PREWARM_MANIFEST = [
+    {
+        "section_id": "services",
+        "prompt": "A cinematic view of a modern creative design studio with dramatic lighting, computer screens showing web designs, dark moody atmosphere with purple and blue accent lights",
+    },
+    {
+        "section_id": "portfolio",
+        "prompt": "A cinematic showcase of multiple website designs displayed on floating screens in a dark futuristic gallery space with dramatic spotlights and reflections",
+    },
+    {
+        "section_id": "benefits",
+        "prompt": "A cinematic scene of a successful business team celebration in a modern glass office at night with city lights in background, warm golden lighting mixed with cool blues",
+    },
+]
+
+prewarm_status = {"total": 0, "warmed": 0, "failed": [], "done": False}
+
+
+def load_prewarm_manifest() -> List[ImageGenerationRequest]:
+    """Read the prewarm manifest from IMAGE_PREWARM_MANIFEST (a JSON file), or use the default.
+
+    A file that can't be read or isn't a JSON list falls back to the default;
+    invalid entries are logged and skipped, so a bad manifest never stops startup.
+    """
+    manifest_path = os.getenv("IMAGE_PREWARM_MANIFEST")
+    entries = DEFAULT_PREWARM_MANIFEST
+    if manifest_path:
+        try:
+            loaded = json.loads(Path(manifest_path).read_text())
+            if not isinstance(loaded, list):
+                raise ValueError("expected a JSON list of entries")
+            entries = loaded
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load prewarm manifest {manifest_path}: {str(e)}")
+    
+    manifest = []
+    for index, entry in enumerate(entries):
+        try:
+            manifest.append(ImageGenerationRequest.model_validate(entry))
+        except ValidationError as e:
+            logger.error(f"Skipping invalid prewarm manifest entry {index}: {e.errors(include_url=False)}")
+    return manifest
+
+
+async def prewarm_images(manifest: List[ImageGenerationRequest]):
+    """Load or generate every manifest image, a few at a time"""
+    semaphore = asyncio.Semaphore(int(os.getenv("IMAGE_PREWARM_CONCURRENCY", "2")))
+    prewarm_status.update(total=len(manifest), warmed=0, failed=[], done=False)
+    
+    async def warm(entry: ImageGenerationRequest):
+        async with semaphore:
+            try:
+                # Only the digest is needed; the bytes stay on disk until requested
+                await _get_or_generate_image(entry.section_id, entry.prompt, with_data=False)
+                prewarm_status["warmed"] += 1
+            except Exception as e:
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                logger.error(f"Prewarm failed for section {entry.section_id}: {detail}")
+                prewarm_status["failed"].append(entry.section_id)
+    
+    logger.info(f"Prewarming {len(manifest)} section images")
+    await asyncio.gather(*(warm(entry) for entry in manifest))
+    prewarm_status["done"] = True
+    logger.info(f"Prewarm finished: {prewarm_status['warmed']}/{len(manifest)} images ready")
+
+
+# Off-peak hours (UTC, "start-end", may wrap past midnight) for refreshing the manifest images
+IMAGE_REFRESH_WINDOW = tuple(int(hour) for hour in os.getenv("IMAGE_REFRESH_WINDOW_UTC", "3-5").split("-"))
+
+
+def _next_refresh_window(now: datetime) -> tuple:
+    """Start and end of the refresh window now is in, or else of the next one"""
+    start_hour, end_hour = IMAGE_REFRESH_WINDOW
+    length = timedelta(hours=(end_hour - start_hour) % 24 or 24)
+    start = now.replace(hour=start_hour, minute=0, second=0, microsecond=0)
+    if start > now:
+        start -= timedelta(days=1)
+    if now >= start + length:
+        start += timedelta(days=1)
+    return start, start + length
+
+
+async def refresh_section_images(manifest: List[ImageGenerationRequest], until: datetime) -> int:
+    """Regenerate the manifest images that are missing or expire before until, one at a time"""
+    refreshed = 0
+    for entry in manifest:
+        enhanced_prompt = _build_enhanced_prompt(entry.prompt)
+        key = _image_cache_key(enhanced_prompt)
+        # Ask the shared store, in case another worker refreshed it this window
+        image = await generated_images_cache.reload(key)
+        if image is not None and (image.expires_at is None or image.expires_at > until):
+            continue
+        
+        task = _inflight_generations.get(key) or _start_generation(
+            key, enhanced_prompt, entry.section_id, priority=_refresh_priority(entry.section_id)
+        )
+        try:
+            await asyncio.shield(task)
+        except HTTPException as e:
+            logger.error(f"Refresh failed for section {entry.section_id}: {e.detail}")
+            continue
+        await generated_images_cache.set_alias(entry.section_id, key)
+        refreshed += 1
+    return refreshed
+
+
+async def image_refresh_scheduler(manifest: List[ImageGenerationRequest]):
+    """Once per off-peak window, refresh the manifest images that would expire before the next one"""
+    while True:
+        now = datetime.now(timezone.utc)
+        start, end = _next_refresh_window(now)
+        # Each worker picks a random point in the first half of the window,
+        # so the second one to run usually finds the images already refreshed
+        start = max(start, now)
+        run_at = start + (end - start) * random.uniform(0, 0.5)
+        await asyncio.sleep((run_at - now).total_seconds())
+        
+        try:
+            refreshed = await refresh_section_images(manifest, until=end + timedelta(days=1))
+            logger.info(f"Off-peak refresh finished: {refreshed}/{len(manifest)} images regenerated")
+        except Exception as e:
+            logger.error(f"Off-peak image refresh failed: {str(e)}")
+        
+        await asyncio.sleep(max((end - datetime.now(timezone.utc)).total_seconds(), 0))
+
+
+@api_router.get("/ready")
+async def readiness():
+    """Readiness probe: 503 until the startup prewarm has finished"""
+    status_code = 200 if prewarm_status["done"] else 503
+    return JSONResponse(status_code=status_code, content={"ready": prewarm_status["done"], **prewarm_status})
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against a strong ETag"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+# Files are streamed in chunks of this size, so memory per download stays flat
+IMAGE_STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def _parse_byte_range(range_header: Optional[str], size: int) -> Optional[tuple]:
+    """Resolve a single "bytes=" Range header to an inclusive (start, end).
+
+    Returns None when the whole file should be sent: no header, a syntax we
+    ignore, or several ranges (allowed by RFC 9110 to be answered with 200).
+    Raises 416 when the range lies outside the file.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", (range_header or "").strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the final N bytes ("bytes=-0" is never satisfiable)
+        length = int(last)
+        start, end = (max(0, size - length), size - 1) if length else (size, size - 1)
+    if start >= size:
+        raise HTTPException(
+            status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+async def _stream_file(path: Path, start: int, length: int):
+    """Yield a byte range of a file chunk by chunk, reading off the event loop"""
+    file = await asyncio.to_thread(open, path, "rb")
+    try:
+        await asyncio.to_thread(file.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await asyncio.to_thread(file.read, min(IMAGE_STREAM_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(file.close)
+
+
+def _negotiate_variant_format(accept: Optional[str]) -> Optional[str]:
+    """Pick the best variant format we can build that the client explicitly accepts, if any"""
+    if not accept:
+        return None
+    accepted = set()
+    for item in accept.split(","):
+        media_type, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(media_type.strip().lower())
+    for fmt in _encodable_variant_formats():
+        if IMAGE_VARIANT_FORMATS[fmt] in accepted:
+            return fmt
+    return None
+
+
+def _select_variant_width(requested: Optional[int]) -> int:
+    """Smallest configured width that covers the requested one"""
+    if requested:
+        for width in IMAGE_VARIANT_WIDTHS:
+            if width >= requested:
+                return width
+    return IMAGE_VARIANT_WIDTHS[-1]
+
+
 @api_router.get("/generated-image/{section_id}")
-async def get_generated_image(section_id: str):
-    """Get a previously generated image as raw bytes"""
-    if section_id not in generated_images_cache:
-        raise HTTPException(status_code=404, detail="Image not found. Generate it first.")
+async def get_generated_image(
+    section_id: str, request: Request, v: Optional[str] = None, w: Optional[int] = None
+):
+    """Get a previously generated image as raw bytes, served from the blob store.
+
+    The ETag is the image's content digest. With ?v=<digest> (the URL handed
+    out by generate-image) the response is immutable and cacheable for a year.
+    Clients that accept AVIF or WebP get a transcoded variant sized by ?w=,
+    and everyone else gets the original PNG. A single byte Range is answered
+    with 206, unless If-Range names a different representation.
+    """
+    blob_store = generated_images_cache.blob_store
     
-    image_data = generated_images_cache[section_id]
-    image_bytes = base64.b64decode(image_data)
+    if v and _DIGEST_PATTERN.match(v) and blob_store.exists(v):
+        digest = v
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        key = await generated_images_cache.resolve_alias(section_id)
+        image = await generated_images_cache.get(key, with_data=False) if key else None
+        if image is None:
+            raise HTTPException(status_code=404, detail="Image not found. Generate it first.")
+        
+        if image.data is not None and not blob_store.exists(image.digest):
+            # The blob directory was wiped under us; restore it from memory
+            await asyncio.to_thread(blob_store.put, image.data)
+        digest = image.digest
+        cache_control = REVALIDATE_CACHE_CONTROL
+    
+    path = blob_store.path(digest)
+    media_type = "image/png"
+    etag = f'"{digest}"'
     
-    return Response(content=image_bytes, media_type="image/png")
+    fmt = _negotiate_variant_format(request.headers.get("accept"))
+    if fmt:
+        width = _select_variant_width(w)
+        variant_path = blob_store.variant_path(digest, width, fmt)
+        if variant_path.is_file():
+            path = variant_path
+            media_type = IMAGE_VARIANT_FORMATS[fmt]
+            etag = f'"{digest}-{width}.{fmt}"'
+        else:
+            # Serve the original for now, but only until the variant is there:
+            # caching it as immutable would pin the full PNG for a year
+            _schedule_variant_build(digest)
+            cache_control = REVALIDATE_CACHE_CONTROL
+    
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept", "Accept-Ranges": "bytes"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    size = path.stat().st_size
+    if_range = request.headers.get("if-range")
+    byte_range = None
+    if if_range is None or if_range.strip() == etag:
+        byte_range = _parse_byte_range(request.headers.get("range"), size)
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _stream_file(path, start, end - start + 1), status_code=206, media_type=media_type, headers=headers
+    )
+
+
+@api_router.get("/image-cache/stats")
+async def get_image_cache_stats():
+    """Hit, miss and eviction counters for the generated image cache"""
+    return generated_images_cache.stats()
 
 
 # Contact Form Models
@@ -205,24 +1706,45 @@ class ContactFormResponse(BaseModel):
     message: str
 
 
-@api_router.post("/send-contact", response_model=ContactFormResponse)
-async def send_contact_email(request: ContactFormRequest):
-    """Send contact form email via SendGrid API"""
-    try:
-        sendgrid_api_key = os.getenv("SENDGRID_API_KEY")
-        recipient_email = os.getenv("CONTACT_EMAIL")
-        from_email = os.getenv("FROM_EMAIL")
-        
-        if not sendgrid_api_key:
-            logger.error("SendGrid API key not configured")
-            raise HTTPException(status_code=500, detail="Email service not configured")
-        
-        if not recipient_email or not from_email:
-            logger.error(f"Email config missing - CONTACT_EMAIL: {recipient_email}, FROM_EMAIL: {from_email}")
-            raise HTTPException(status_code=500, detail="Email configuration incomplete")
-        
-        # HTML email content
-        html_content = f"""
+# Contact submissions double as a durable outbox: they are stored first and
+# delivered by background workers with retries and exponential backoff
+CONTACT_DELIVERY_CONCURRENCY = int(os.getenv("CONTACT_DELIVERY_CONCURRENCY", "2"))
+CONTACT_DELIVERY_MAX_ATTEMPTS = int(os.getenv("CONTACT_DELIVERY_MAX_ATTEMPTS", "8"))
+CONTACT_RETRY_BASE_SECONDS = float(os.getenv("CONTACT_RETRY_BASE_SECONDS", "5"))
+CONTACT_RETRY_MAX_SECONDS = float(os.getenv("CONTACT_RETRY_MAX_SECONDS", "900"))
+CONTACT_OUTBOX_POLL_SECONDS = float(os.getenv("CONTACT_OUTBOX_POLL_SECONDS", "5"))
+# A claimed submission is handed to another worker if not settled within this time
+CONTACT_DELIVERY_LEASE_SECONDS = 120
+# Digest mode: submissions due within the window (or up to the max count) go out as one email
+CONTACT_DIGEST_ENABLED = os.getenv("CONTACT_DIGEST_ENABLED", "false").lower() == "true"
+CONTACT_DIGEST_WINDOW_SECONDS = float(os.getenv("CONTACT_DIGEST_WINDOW_SECONDS", "60"))
+CONTACT_DIGEST_MAX = int(os.getenv("CONTACT_DIGEST_MAX", "25"))
+
+contact_delivery_stats = {"emails_sent": 0, "send_failures": 0, "submissions_delivered": 0}
+
+# Set when a submission is queued so idle workers pick it up without waiting for the poll
+_contact_outbox_wakeup = asyncio.Event()
+
+
+class EmailDeliveryError(Exception):
+    pass
+
+
+def _render_contact_email(submission: dict) -> "Mail":
+    """Build the SendGrid message for a stored contact submission"""
+    recipient_email = os.getenv("CONTACT_EMAIL")
+    from_email = os.getenv("FROM_EMAIL")
+    
+    if not recipient_email or not from_email:
+        logger.error(f"Email config missing - CONTACT_EMAIL: {recipient_email}, FROM_EMAIL: {from_email}")
+        raise EmailDeliveryError("Email configuration incomplete")
+    
+    name = submission["name"]
+    email = submission["email"]
+    message_text = submission["message"]
+    
+    # HTML email content
+    html_content = f"""
 <!DOCTYPE html>
 <html>
 <head>
@@ -247,15 +1769,15 @@ async def send_contact_email(request: ContactFormRequest):
         <div class="content">
             <div class="field">
                 <div class="label">Name</div>
-                <div class="value">{request.name}</div>
+                <div class="value">{name}</div>
             </div>
             <div class="field">
                 <div class="label">Email</div>
-                <div class="value"><a href="mailto:{request.email}" style="color: #7c3aed;">{request.email}</a></div>
+                <div class="value"><a href="mailto:{email}" style="color: #7c3aed;">{email}</a></div>
             </div>
             <div class="field">
                 <div class="label">Message</div>
-                <div class="message-box">{request.message.replace(chr(10), '<br>')}</div>
+                <div class="message-box">{message_text.replace(chr(10), '<br>')}</div>
             </div>
         </div>
         <div class="footer">
@@ -265,67 +1787,591 @@ async def send_contact_email(request: ContactFormRequest):
 </body>
 </html>
 """
-        
-        # Create SendGrid message
-        message = Mail(
-            from_email=Email(from_email, "Code and Canvas"),
-            to_emails=To(recipient_email),
-            subject=f"New Contact Form Submission from {request.name}",
-            html_content=Content(MimeType.html, html_content)
+    
+    # Create SendGrid message
+    from sendgrid.helpers.mail import Mail, Email, To, Content, MimeType
+    
+    message = Mail(
+        from_email=Email(from_email, "Code and Canvas"),
+        to_emails=To(recipient_email),
+        subject=f"New Contact Form Submission from {name}",
+        html_content=Content(MimeType.html, html_content)
+    )
+    
+    # Add reply-to header so you can reply directly to the sender
+    message.reply_to = Email(email, name)
+    return message
+
+
+async def _send_email(message: "Mail"):
+    """Send a message through the pooled SendGrid client, raising EmailDeliveryError on failure"""
+    sg = get_sendgrid_client()
+    if sg is None:
+        logger.error("SendGrid API key not configured")
+        raise EmailDeliveryError("Email service not configured")
+    
+    try:
+        with SENDGRID_LATENCY.time(), span("sendgrid"):
+            response = await sg.post("/v3/mail/send", json=message.get())
+    except httpx.HTTPError as e:
+        contact_delivery_stats["send_failures"] += 1
+        raise EmailDeliveryError(f"SendGrid request failed: {e!r}") from e
+    
+    if response.status_code < 200 or response.status_code >= 300:
+        contact_delivery_stats["send_failures"] += 1
+        raise EmailDeliveryError(f"SendGrid returned status {response.status_code} - Body: {response.text}")
+    contact_delivery_stats["emails_sent"] += 1
+
+
+def _render_contact_digest(submissions: List[dict]) -> "Mail":
+    """Build one SendGrid message listing several contact submissions"""
+    recipient_email = os.getenv("CONTACT_EMAIL")
+    from_email = os.getenv("FROM_EMAIL")
+    
+    if not recipient_email or not from_email:
+        logger.error(f"Email config missing - CONTACT_EMAIL: {recipient_email}, FROM_EMAIL: {from_email}")
+        raise EmailDeliveryError("Email configuration incomplete")
+    
+    entries = "".join(
+        f"""
+            <div class="message-box">
+                <div class="value"><strong>{submission['name']}</strong> &middot; <a href="mailto:{submission['email']}" style="color: #7c3aed;">{submission['email']}</a></div>
+                <div class="value">{submission['message'].replace(chr(10), '<br>')}</div>
+            </div>"""
+        for submission in submissions
+    )
+    html_content = f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body {{ font-family: 'Inter', Arial, sans-serif; line-height: 1.6; color: #333; }}
+        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+        .header {{ background: linear-gradient(135deg, #7c3aed 0%, #9333ea 100%); color: white; padding: 30px; border-radius: 10px 10px 0 0; }}
+        .content {{ background: #f9fafb; padding: 30px; border-radius: 0 0 10px 10px; }}
+        .value {{ font-size: 16px; color: #1f2937; margin-top: 5px; }}
+        .message-box {{ background: white; padding: 20px; border-radius: 8px; border-left: 4px solid #7c3aed; margin-top: 10px; }}
+        .footer {{ text-align: center; margin-top: 20px; color: #9ca3af; font-size: 12px; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1 style="margin: 0; font-size: 24px;">{len(submissions)} New Contact Form Submissions</h1>
+        </div>
+        <div class="content">{entries}
+        </div>
+        <div class="footer">
+            Sent from Code and Canvas website contact form
+        </div>
+    </div>
+</body>
+</html>
+"""
+    
+    from sendgrid.helpers.mail import Mail, Email, To, Content, MimeType
+    
+    return Mail(
+        from_email=Email(from_email, "Code and Canvas"),
+        to_emails=To(recipient_email),
+        subject=f"{len(submissions)} new contact form submissions",
+        html_content=Content(MimeType.html, html_content)
+    )
+
+
+def _retry_delay(attempts: int) -> float:
+    """Exponential backoff with full jitter, capped at CONTACT_RETRY_MAX_SECONDS"""
+    ceiling = min(CONTACT_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), CONTACT_RETRY_MAX_SECONDS)
+    return random.uniform(ceiling / 2, ceiling)
+
+
+async def deliver_contact_submissions(submissions: List[dict]):
+    """Email claimed submissions (as a digest when there are several) and record the outcome"""
+    now = datetime.now(timezone.utc)
+    try:
+        with span("render"):
+            if len(submissions) == 1:
+                message = _render_contact_email(submissions[0])
+            else:
+                message = _render_contact_digest(submissions)
+        await _send_email(message)
+    except EmailDeliveryError as e:
+        for submission in submissions:
+            attempts = submission.get("attempts", 0) + 1
+            give_up = attempts >= CONTACT_DELIVERY_MAX_ATTEMPTS
+            logger.error(f"Contact email {submission['id']} failed (attempt {attempts}): {str(e)}")
+            with span("mongo"):
+                await db.contact_submissions.update_one(
+                    {"id": submission["id"]},
+                    {"$set": {
+                        "delivery_status": "failed" if give_up else "retrying",
+                        "attempts": attempts,
+                        "last_error": str(e),
+                        "next_attempt_at": None if give_up else now + timedelta(seconds=_retry_delay(attempts)),
+                    }},
+                )
+        return
+    
+    logger.info(f"Successfully sent contact email for {len(submissions)} submission(s)")
+    contact_delivery_stats["submissions_delivered"] += len(submissions)
+    with span("mongo"):
+        await db.contact_submissions.update_many(
+            {"id": {"$in": [submission["id"] for submission in submissions]}},
+            {
+                "$set": {
+                    "delivery_status": "sent",
+                    "email_sent": True,
+                    "sent_at": now,
+                    "last_error": None,
+                    "next_attempt_at": None,
+                },
+                "$inc": {"attempts": 1},
+            },
         )
+
+
+def _due_contact_filter(now: datetime) -> dict:
+    """Submissions ready for a delivery attempt, including ones whose lease expired"""
+    return {"$or": [
+        {"delivery_status": {"$in": ["pending", "retrying"]}, "next_attempt_at": {"$lte": now}},
+        {"delivery_status": "sending", "lease_expires_at": {"$lte": now}},
+    ]}
+
+
+async def _claim_contact_submission() -> Optional[dict]:
+    """Atomically lease the next due submission"""
+    now = datetime.now(timezone.utc)
+    return await db.contact_submissions.find_one_and_update(
+        _due_contact_filter(now),
+        {"$set": {
+            "delivery_status": "sending",
+            "lease_expires_at": now + timedelta(seconds=CONTACT_DELIVERY_LEASE_SECONDS),
+        }},
+        projection={"_id": 0},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _wait_for_contact_submissions(timeout: float):
+    """Sleep until the timeout or until a new submission is queued"""
+    _contact_outbox_wakeup.clear()
+    try:
+        # asyncio.timeout rather than wait_for: on 3.11, wait_for swallows a
+        # cancellation that races with the event being set, and the worker
+        # then never stops at shutdown
+        async with asyncio.timeout(timeout):
+            await _contact_outbox_wakeup.wait()
+    except TimeoutError:
+        pass
+
+
+async def _deliver_claimed(submissions: List[dict]):
+    """Deliver claimed submissions without letting an error stop the worker.
+
+    A submission whose outcome could not be recorded keeps its lease and is
+    claimed again once the lease expires.
+    """
+    try:
+        with traced("contact_delivery", submissions=len(submissions)):
+            await deliver_contact_submissions(submissions)
+    except Exception as e:
+        ids = ", ".join(submission["id"] for submission in submissions)
+        logger.error(f"Contact delivery failed for {ids}: {str(e)}")
+
+
+async def contact_delivery_worker():
+    """Deliver queued contact submissions one email each, until cancelled"""
+    while True:
+        try:
+            submission = await _claim_contact_submission()
+        except Exception as e:
+            logger.error(f"Contact outbox claim failed: {str(e)}")
+            submission = None
         
-        # Add reply-to header so you can reply directly to the sender
-        message.reply_to = Email(request.email, request.name)
-        
-        logger.info(f"Attempting to send contact email from {request.name} ({request.email})")
-        
-        # Send via SendGrid API
-        sg = SendGridAPIClient(sendgrid_api_key)
-        response = sg.send(message)
+        if submission is not None:
+            await _deliver_claimed([submission])
+            continue
         
-        if response.status_code >= 200 and response.status_code < 300:
-            logger.info(f"Successfully sent contact email from {request.name} (status: {response.status_code})")
-        else:
-            logger.error(f"SendGrid returned status {response.status_code}")
-            raise HTTPException(status_code=500, detail="Failed to send email")
+        # Nothing due: sleep until the next poll or a new submission arrives
+        await _wait_for_contact_submissions(CONTACT_OUTBOX_POLL_SECONDS)
+
+
+async def contact_digest_worker():
+    """Deliver queued contact submissions as digest emails, until cancelled.
+
+    The oldest due submission opens a window of CONTACT_DIGEST_WINDOW_SECONDS;
+    everything due when it closes, or as soon as CONTACT_DIGEST_MAX are
+    waiting, is claimed and sent in a single email.
+    """
+    while True:
+        try:
+            now = datetime.now(timezone.utc)
+            oldest = await db.contact_submissions.find_one(
+                _due_contact_filter(now), {"_id": 0, "next_attempt_at": 1}, sort=[("next_attempt_at", 1)]
+            )
+            if oldest is None:
+                await _wait_for_contact_submissions(CONTACT_OUTBOX_POLL_SECONDS)
+                continue
+            
+            window_closes = (oldest.get("next_attempt_at") or now) + timedelta(seconds=CONTACT_DIGEST_WINDOW_SECONDS)
+            waiting = await db.contact_submissions.count_documents(_due_contact_filter(now))
+            if now < window_closes and waiting < CONTACT_DIGEST_MAX:
+                await _wait_for_contact_submissions((window_closes - now).total_seconds())
+                continue
+            
+            batch = []
+            while len(batch) < CONTACT_DIGEST_MAX:
+                submission = await _claim_contact_submission()
+                if submission is None:
+                    break
+                batch.append(submission)
+        except Exception as e:
+            logger.error(f"Contact outbox claim failed: {str(e)}")
+            await asyncio.sleep(CONTACT_OUTBOX_POLL_SECONDS)
+            continue
         
-        # Store in database for records
+        if batch:
+            await _deliver_claimed(batch)
+
+
+async def migrate_contact_submission_timestamps() -> int:
+    """Convert legacy ISO-string timestamps in contact_submissions to native datetimes.
+
+    Submissions stored before the outbox kept string timestamps, which the
+    export's date-range filter never matches and its sort puts before every
+    dated row. Runs at startup, like migrate_status_check_timestamps.
+    """
+    migrated = await _migrate_string_timestamps(db.contact_submissions)
+    if migrated:
+        logger.info(f"Migrated {migrated} contact submission timestamps to native datetimes")
+    return migrated
+
+
+@api_router.post("/send-contact", response_model=ContactFormResponse)
+async def send_contact_email(request: ContactFormRequest):
+    """Store a contact submission and queue it for email delivery via SendGrid"""
+    try:
+        now = datetime.now(timezone.utc)
         contact_doc = {
             "id": str(uuid.uuid4()),
             "name": request.name,
             "email": request.email,
             "message": request.message,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "email_sent": True
+            "timestamp": now,
+            "email_sent": False,
+            "delivery_status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
         }
-        await db.contact_submissions.insert_one(contact_doc)
-        
-        return ContactFormResponse(
-            success=True,
-            message="Thank you! Your message has been sent successfully."
-        )
-        
-    except HTTPException:
-        raise
+        with span("mongo"):
+            await db.contact_submissions.insert_one(contact_doc)
     except Exception as e:
-        # Log more details for SendGrid errors
-        error_msg = str(e)
-        if hasattr(e, 'body'):
-            error_msg = f"{error_msg} - Body: {e.body}"
-        if hasattr(e, 'status_code'):
-            error_msg = f"{error_msg} - Status: {e.status_code}"
-        if hasattr(e, 'reason'):
-            error_msg = f"{error_msg} - Reason: {e.reason}"
-        if hasattr(e, 'to_dict'):
-            error_msg = f"{error_msg} - Dict: {e.to_dict}"
-        logger.error(f"Error sending contact email: {error_msg}")
-        logger.error(f"FROM_EMAIL used: {from_email}, CONTACT_EMAIL used: {recipient_email}")
+        logger.error(f"Error storing contact submission: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to send message: {str(e)}")
+    
+    logger.info(f"Queued contact email from {request.name} ({request.email})")
+    _contact_outbox_wakeup.set()
+    
+    return ContactFormResponse(
+        success=True,
+        message="Thank you! Your message has been sent successfully."
+    )
+
+
+class AppStateCollector:
+    """Reports cache, queue and outbox state when /metrics is scraped"""
+
+    def collect(self):
+        stats = generated_images_cache.stats()
+        for name in ("hits", "store_hits", "misses", "evictions", "expired_hits"):
+            counter = CounterMetricFamily(f"image_cache_{name}", f"Generated image cache {name.replace('_', ' ')}")
+            counter.add_metric([], stats[name])
+            yield counter
+        yield GaugeMetricFamily("image_cache_entries", "Images held in memory", value=stats["entries"])
+        yield GaugeMetricFamily("image_cache_size_bytes", "Bytes of images held in memory", value=stats["size_bytes"])
+        yield GaugeMetricFamily(
+            "image_generations_in_flight", "Distinct generations queued or running", value=len(_inflight_generations)
+        )
+        yield GaugeMetricFamily(
+            "gemini_generations_active", "Generations holding a Gemini slot", value=gemini_scheduler.active
+        )
+        yield GaugeMetricFamily(
+            "gemini_queue_depth", "Generations waiting for a Gemini slot", value=gemini_scheduler.depth
+        )
+        yield GaugeMetricFamily(
+            "gemini_circuit_open", "1 while the Gemini circuit breaker refuses calls",
+            value=int(not gemini_breaker.accepting),
+        )
+        opens = CounterMetricFamily("gemini_circuit_opens", "Times the Gemini circuit breaker opened")
+        opens.add_metric([], gemini_breaker.opens)
+        yield opens
+        rejected = CounterMetricFamily("gemini_queue_rejected", "Generations refused because the queue was full")
+        rejected.add_metric([], gemini_scheduler.rejected)
+        yield rejected
+        for name, value in contact_delivery_stats.items():
+            counter = CounterMetricFamily(f"contact_{name}", f"Contact outbox {name.replace('_', ' ')}")
+            counter.add_metric([], value)
+            yield counter
+        if status_write_buffer is not None:
+            yield GaugeMetricFamily(
+                "status_write_buffer_pending", "Status checks waiting to be written",
+                value=status_write_buffer.queue.qsize(),
+            )
+
+
+REGISTRY.register(AppStateCollector())
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each request by its route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        method = scope["method"]
+        started = time.perf_counter()
+        status = 500
+        response_bytes = 0
+        
+        async def send_wrapper(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+        
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            # The router records the matched route on the scope; templates keep label cardinality bounded
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            REQUEST_LATENCY.labels(method, route_path, str(status)).observe(time.perf_counter() - started)
+            RESPONSE_BYTES.labels(route_path).inc(response_bytes)
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    REQUEST_BYTES.labels(route_path).inc(int(value))
+                    break
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware giving each request a trace for span() to record into.
+
+    Requests that recorded spans get a Server-Timing header (stages finished
+    before the response started, plus the total so far) and a trace log line
+    with every stage once the response is done.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        spans = {}
+        token = _current_trace.set(spans)
+        started = time.perf_counter()
+        status = 500
+        
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if spans:
+                    timings = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in spans.items()]
+                    timings.append(f"total;dur={(time.perf_counter() - started) * 1000:.3f}")
+                    headers = [*message.get("headers", []), (b"server-timing", ", ".join(timings).encode("latin-1"))]
+                    message = {**message, "headers": headers}
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            if spans:
+                _log_trace(
+                    "request", spans, time.perf_counter() - started,
+                    method=scope["method"], path=scope["path"], status=status,
+                )
+
+
+def _require_admin(request: Request):
+    """Allow only requests bearing ADMIN_TOKEN; admin routes don't exist while it is unset"""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(supplied.encode("utf-8"), admin_token.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+def _sample_stacks(seconds: float, interval: float, thread_ids: Optional[set] = None) -> dict:
+    """Sample Python stacks every interval for a while, as folded stack -> sample count.
+
+    Each stack is "thread;outermost;...;innermost", the collapsed format read
+    by flamegraph.pl, speedscope and most flame graph viewers.
+    """
+    sampler_id = threading.get_ident()
+    stacks = {}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == sampler_id or (thread_ids is not None and thread_id not in thread_ids):
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            frames.append(thread_names.get(thread_id, str(thread_id)))
+            stack = ";".join(name.replace(";", ":") for name in reversed(frames))
+            stacks[stack] = stacks.get(stack, 0) + 1
+        time.sleep(interval)
+    return stacks
+
+
+_profile_running = False
+
+
+@api_router.get("/admin/profile", include_in_schema=False)
+async def profile_worker(
+    request: Request,
+    seconds: float = Query(10, gt=0, le=60),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    all_threads: bool = False,
+):
+    """Sample this worker's stacks for a few seconds and return them folded for a flame graph.
+
+    By default only the event loop thread is sampled, which is where request
+    handling runs; all_threads adds the executor and driver threads.
+    Requires "Authorization: Bearer <ADMIN_TOKEN>".
+    """
+    global _profile_running
+    _require_admin(request)
+    if _profile_running:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    
+    _profile_running = True
+    try:
+        # The sampler runs in a thread, so the loop keeps serving (and being sampled)
+        thread_ids = None if all_threads else {threading.get_ident()}
+        stacks = await asyncio.to_thread(_sample_stacks, seconds, interval_ms / 1000, thread_ids)
+    finally:
+        _profile_running = False
+    
+    logger.info(f"Profiled worker for {seconds:g}s: {sum(stacks.values())} samples")
+    folded = "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+    return PlainTextResponse(folded)
+
+
+CONTACT_EXPORT_FIELDS = ["id", "timestamp", "name", "email", "message", "delivery_status", "email_sent", "attempts"]
+CONTACT_EXPORT_PROJECTION = {"_id": 0, **{field: 1 for field in CONTACT_EXPORT_FIELDS}}
+
+# Rows fetched per cursor batch, and written per streamed chunk
+CONTACT_EXPORT_BATCH_SIZE = int(os.getenv("CONTACT_EXPORT_BATCH_SIZE", "1000"))
+
+
+def _csv_safe(value):
+    """Neutralise cells a spreadsheet would run as a formula (the fields come from a public form)"""
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@", "\t", "\r"):
+        return "'" + value
+    return value
+
+
+async def _contact_export_csv(cursor):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CONTACT_EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    rows = 0
+    async for submission in cursor:
+        if isinstance(submission.get("timestamp"), datetime):
+            submission["timestamp"] = submission["timestamp"].isoformat()
+        writer.writerow({field: _csv_safe(value) for field, value in submission.items()})
+        rows += 1
+        if rows % CONTACT_EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+async def _contact_export_ndjson(cursor):
+    lines = []
+    async for submission in cursor:
+        lines.append(_ndjson_line(submission))
+        if len(lines) == CONTACT_EXPORT_BATCH_SIZE:
+            yield b"".join(lines)
+            lines = []
+    yield b"".join(lines)
+
+
+@api_router.get("/admin/contact-submissions/export", include_in_schema=False)
+async def export_contact_submissions(
+    request: Request,
+    format: Literal["csv", "ndjson"] = "csv",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Stream contact submissions received in [since, until), oldest first, as CSV or NDJSON.
+
+    Rows go straight from a batched Mongo cursor to the client, a batch at a
+    time, so memory stays flat however many there are. The range and the
+    order are both served by the timestamp index. Naive datetimes are UTC.
+    Requires "Authorization: Bearer <ADMIN_TOKEN>".
+    """
+    _require_admin(request)
+    since, until = [
+        value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+        for value in (since, until)
+    ]
+    if since is not None and until is not None and since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+
+    query = {}
+    if since is not None:
+        query.setdefault("timestamp", {})["$gte"] = since
+    if until is not None:
+        query.setdefault("timestamp", {})["$lt"] = until
+    cursor = (
+        db.contact_submissions.find(query, CONTACT_EXPORT_PROJECTION)
+        .sort("timestamp", 1)
+        .batch_size(CONTACT_EXPORT_BATCH_SIZE)
+    )
+
+    logger.info(f"Exporting contact submissions as {format} (since={since}, until={until})")
+    if format == "ndjson":
+        body, media_type = _contact_export_ndjson(cursor), "application/x-ndjson"
+    else:
+        body, media_type = _contact_export_csv(cursor), "text/csv; charset=utf-8"
+    filename = f"contact-submissions.{format}"
+    return StreamingResponse(
+        body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
 
 
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Per-request overhead of the Gemini and SendGrid clients, before and after pooling.
+
+"Before" builds a new genai.Client / SendGridAPIClient for every call, as the
+routes used to. "After" reuses the server's process-lifetime pooled clients.
+Both run against a local stub API, so the difference is client construction
+and connection setup (real traffic also pays a TLS handshake per new connection).
+
+    python -m benchmarks.bench_api_clients [--requests 200]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.stubs import StubAPIServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+def summarize(name: str, samples: list, connections: int):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"{name:<28} mean {statistics.mean(samples) * 1000:7.2f} ms   "
+        f"p50 {statistics.median(samples) * 1000:7.2f} ms   p95 {p95 * 1000:7.2f} ms   "
+        f"connections {connections}"
+    )
+
+
+async def timed(count: int, call) -> list:
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def main(count: int):
+    with StubAPIServer() as stub:
+        os.environ.update({
+            "MONGO_URL": os.getenv("MONGO_URL", "mongodb://localhost:27017"),
+            "DB_NAME": os.getenv("DB_NAME", "benchmark"),
+            "GEMINI_API_KEY": "benchmark",
+            "SENDGRID_API_KEY": "benchmark",
+            "CONTACT_EMAIL": "studio@example.com",
+            "FROM_EMAIL": "noreply@example.com",
+            "GEMINI_BASE_URL": stub.url,
+            "SENDGRID_BASE_URL": stub.url,
+        })
+        import server
+        from google import genai
+        from google.genai import types
+
+        logging.disable(logging.INFO)
+        from sendgrid import SendGridAPIClient
+
+        message = server._render_contact_email(
+            {"name": "Benchmark", "email": "bench@example.com", "message": "Benchmark message body"}
+        )
+
+        async def gemini_per_request():
+            client = genai.Client(api_key="benchmark", http_options=types.HttpOptions(base_url=stub.url))
+            await client.aio.models.generate_content(model=server.GEMINI_IMAGE_MODEL, contents="benchmark")
+            await client.aio.aclose()
+
+        async def gemini_pooled():
+            await server.get_gemini_client().aio.models.generate_content(
+                model=server.GEMINI_IMAGE_MODEL, contents="benchmark"
+            )
+
+        async def sendgrid_per_request():
+            await asyncio.to_thread(SendGridAPIClient("benchmark", host=stub.url).send, message)
+
+        async def sendgrid_pooled():
+            await server._send_email(message)
+
+        for name, call in [
+            ("gemini: client per request", gemini_per_request),
+            ("gemini: pooled client", gemini_pooled),
+            ("sendgrid: client per request", sendgrid_per_request),
+            ("sendgrid: pooled client", sendgrid_pooled),
+        ]:
+            await call()  # warm up imports and the pool
+            connections_before = stub.connections
+            samples = await timed(count, call)
+            summarize(name, samples, stub.connections - connections_before)
+
+        await server.close_api_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    asyncio.run(main(parser.parse_args().requests))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Contact-form burst: per-submission emails versus digest mode.
+
+Fires a synthetic burst at /api/send-contact in-process, backed by the
+in-memory Mongo stand-in and a stub SendGrid with realistic latency, then
+runs the outbox workers until every submission is delivered. Reports
+acknowledgement throughput, time to deliver everything and the number of
+outbound SendGrid calls.
+
+    python -m benchmarks.bench_contact_digest [--submissions 200] [--latency 0.08]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.memory_mongo import MemoryDatabase
+from benchmarks.stubs import StubAPIServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+async def run_burst(server, stub, submissions: int, digest: bool) -> dict:
+    server.db = MemoryDatabase()
+    server._contact_outbox_wakeup = asyncio.Event()
+    server.contact_delivery_stats.update(emails_sent=0, send_failures=0, submissions_delivered=0)
+    await server.close_api_clients()
+    calls_before = stub.requests
+
+    if digest:
+        workers = [asyncio.create_task(server.contact_digest_worker())]
+    else:
+        workers = [
+            asyncio.create_task(server.contact_delivery_worker())
+            for _ in range(server.CONTACT_DELIVERY_CONCURRENCY)
+        ]
+
+    form = {"name": "Burst", "email": "burst@example.com", "message": "Synthetic burst submission"}
+    transport = httpx.ASGITransport(app=server.app)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        responses = await asyncio.gather(*(client.post("/api/send-contact", json=form) for _ in range(submissions)))
+    acknowledged = time.perf_counter() - started
+    assert all(response.status_code == 200 for response in responses)
+
+    while server.contact_delivery_stats["submissions_delivered"] < submissions:
+        await asyncio.sleep(0.01)
+    delivered = time.perf_counter() - started
+
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    return {
+        "ack_per_second": submissions / acknowledged,
+        "delivered_seconds": delivered,
+        "outbound_calls": stub.requests - calls_before,
+    }
+
+
+async def main(submissions: int, latency: float):
+    with StubAPIServer(sendgrid_latency=latency) as stub:
+        os.environ.update({
+            "MONGO_URL": os.getenv("MONGO_URL", "mongodb://localhost:27017"),
+            "DB_NAME": os.getenv("DB_NAME", "benchmark"),
+            "SENDGRID_API_KEY": "benchmark",
+            "SENDGRID_BASE_URL": stub.url,
+            "CONTACT_EMAIL": "studio@example.com",
+            "FROM_EMAIL": "noreply@example.com",
+        })
+        import server
+
+        logging.disable(logging.INFO)
+        server.CONTACT_DIGEST_WINDOW_SECONDS = 0.5
+
+        for name, digest in [("per-submission", False), (f"digest (max {server.CONTACT_DIGEST_MAX})", True)]:
+            result = await run_burst(server, stub, submissions, digest)
+            print(
+                f"{name:<20} ack {result['ack_per_second']:8.0f}/s   "
+                f"all delivered in {result['delivered_seconds']:6.2f} s   "
+                f"SendGrid calls {result['outbound_calls']}"
+            )
+        await server.close_api_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.08, help="stub SendGrid latency in seconds")
+    args = parser.parse_args()
+    asyncio.run(main(args.submissions, args.latency))
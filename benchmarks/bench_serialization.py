@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Serialization cost per endpoint: FastAPI's default path versus the orjson fast path.
+
+"default" replays what FastAPI does for a route with a response_model:
+validate the content through the model, jsonable_encoder it, then render
+with the stdlib JSONResponse. "fast" is what the routes now do for trusted
+data: render the plain dicts with FastJSONResponse. Payloads mirror real
+responses (a full page of status checks, a multi-megabyte base64 image).
+
+    python -m benchmarks.bench_serialization                 # print timings
+    python -m benchmarks.bench_serialization --save base.json
+    python -m benchmarks.bench_serialization --compare base.json   # exit 1 on regression
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+import server  # noqa: E402
+
+# A run slower than the baseline by more than this factor counts as a regression
+REGRESSION_FACTOR = 1.5
+
+
+def status_page(rows: int) -> list:
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        {"id": f"{i:08d}-status", "client_name": f"client {i}", "timestamp": start + timedelta(seconds=i)}
+        for i in range(rows)
+    ]
+
+
+def image_payload(size: int) -> dict:
+    return {"section_id": "services", "image_data": base64.b64encode(os.urandom(size)).decode("ascii")}
+
+
+def default_render(model, content) -> bytes:
+    validated = TypeAdapter(model).validate_python(content)
+    return JSONResponse(jsonable_encoder(validated, exclude_none=True)).body
+
+
+def fast_render(content) -> bytes:
+    return server.FastJSONResponse(content).body
+
+
+CASES = {
+    "GET /api/status (1000 rows)": (List[server.StatusCheck], status_page(1000)),
+    "GET /api/status (100 rows)": (List[server.StatusCheck], status_page(100)),
+    "POST /api/generate-image (2 MB)": (server.ImageGenerationResponse, image_payload(2 * 1024 * 1024)),
+    "POST /api/send-contact": (server.ContactFormResponse, {"success": True, "message": "Thank you!"}),
+}
+
+
+def measure(func, repeat: int = 5) -> float:
+    """Best-of-N seconds per call"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run_cases() -> dict:
+    results = {}
+    for name, (model, content) in CASES.items():
+        results[name] = {
+            "default_us": measure(lambda: default_render(model, content)) * 1e6,
+            "fast_us": measure(lambda: fast_render(content)) * 1e6,
+            "bytes": len(fast_render(content)),
+        }
+    return results
+
+
+def main(save: Optional[str], compare: Optional[str]) -> int:
+    results = run_cases()
+    for name, result in results.items():
+        print(
+            f"{name:<34} default {result['default_us']:10.1f} us   fast {result['fast_us']:10.1f} us   "
+            f"x{result['default_us'] / result['fast_us']:5.1f}   {result['bytes']} bytes"
+        )
+
+    if save:
+        Path(save).write_text(json.dumps(results, indent=2))
+    if compare:
+        baseline = json.loads(Path(compare).read_text())
+        regressions = [
+            f"{name}: {results[name]['fast_us']:.1f} us vs baseline {baseline[name]['fast_us']:.1f} us"
+            for name in results
+            if name in baseline and results[name]["fast_us"] > baseline[name]["fast_us"] * REGRESSION_FACTOR
+        ]
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="fail if slower than this saved baseline")
+    args = parser.parse_args()
+    sys.exit(main(args.save, args.compare))
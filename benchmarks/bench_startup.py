@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Cold-start budget: import time of server.py and time to first response.
+
+Every measurement runs in a fresh interpreter, as a new worker would:
+
+- import: `python -X importtime -c "import server"`, reporting the total,
+  the slowest imports, and any SDK that is meant to load lazily but didn't
+- first response: spawn a process that imports server, runs the lifespan
+  handler (against the in-memory Mongo stand-in) and serves GET /api/,
+  timed from spawn to response
+
+The median of --runs samples is compared against the budgets, and the
+exit status is 1 when either is exceeded, so CI can run it as a gate.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --import-budget 1.0 --first-response-budget 2.5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = REPO_ROOT / "backend"
+
+# Loaded on first use by server.py; importing any of these at startup is a regression
+LAZY_MODULES = ("google.genai", "sendgrid", "PIL")
+
+IMPORT_BUDGET_SECONDS = float(os.getenv("STARTUP_IMPORT_BUDGET_SECONDS", "1.5"))
+FIRST_RESPONSE_BUDGET_SECONDS = float(os.getenv("STARTUP_FIRST_RESPONSE_BUDGET_SECONDS", "3.0"))
+
+
+def _child_env() -> dict:
+    env = dict(os.environ)
+    env.update({
+        "MONGO_URL": env.get("MONGO_URL", "mongodb://localhost:27017"),
+        "DB_NAME": env.get("DB_NAME", "startup_benchmark"),
+        "IMAGE_PREWARM_ENABLED": "false",
+        "PYTHONPATH": os.pathsep.join([str(BACKEND_DIR), str(REPO_ROOT)]),
+    })
+    return env
+
+
+def measure_import() -> tuple:
+    """Seconds to import server in a fresh interpreter, and per-module cumulative seconds"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, env=_child_env(), capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative) / 1e6
+    return modules["server"], modules
+
+
+def measure_first_response() -> float:
+    """Seconds from spawning a server process to its first GET /api/ response"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child"],
+        cwd=REPO_ROOT, env=_child_env(), capture_output=True, text=True, check=True,
+    )
+    elapsed = float(result.stdout.split()[-1])
+    return elapsed - started
+
+
+def serve_first_request():
+    """Child process: start the app and print when the first response arrived"""
+    import asyncio
+    import logging
+
+    import httpx
+
+    import server
+    from benchmarks.memory_mongo import MemoryDatabase
+
+    logging.disable(logging.WARNING)
+    server.db = MemoryDatabase()
+
+    async def first_response():
+        async with server.app.router.lifespan_context(server.app):
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+                response = await client.get("/api/")
+                response.raise_for_status()
+                return time.perf_counter()
+
+    # perf_counter is system-wide on Linux and macOS, so the parent can subtract
+    print(asyncio.run(first_response()))
+
+
+def main(runs: int, import_budget: float, first_response_budget: float) -> int:
+    import_samples = []
+    for _ in range(runs):
+        total, modules = measure_import()
+        import_samples.append(total)
+    first_response_samples = [measure_first_response() for _ in range(runs)]
+
+    print("slowest imports (cumulative):")
+    for name, seconds in sorted(modules.items(), key=lambda item: -item[1])[:10]:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+    failures = []
+    eager = [name for name in LAZY_MODULES if name in modules]
+    if eager:
+        failures.append(f"imported at startup but meant to be lazy: {', '.join(eager)}")
+    for label, samples, budget in [
+        ("import server", import_samples, import_budget),
+        ("first response", first_response_samples, first_response_budget),
+    ]:
+        median = statistics.median(samples)
+        print(f"{label:<15} median {median * 1000:8.1f} ms   budget {budget * 1000:8.1f} ms")
+        if median > budget:
+            failures.append(f"{label} took {median:.2f}s, over the {budget:.2f}s budget")
+
+    for failure in failures:
+        print(f"OVER BUDGET {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_SECONDS, help="seconds")
+    parser.add_argument("--first-response-budget", type=float, default=FIRST_RESPONSE_BUDGET_SECONDS, help="seconds")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        serve_first_request()
+    else:
+        sys.exit(main(args.runs, args.import_budget, args.first_response_budget))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Sustained status-check ingestion against a local mongod: single vs batched writes.
+
+Compares one insert_one per status check (the default POST /api/status path),
+the opt-in StatusWriteBuffer, and insert_many batches (POST /api/status/batch).
+Writes go to a throwaway database that is dropped afterwards.
+
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.bench_status_ingest [--docs 20000]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+BENCHMARK_DB = "status_ingest_benchmark"
+
+
+def make_docs(server, count: int) -> list:
+    return [server.StatusCheck(client_name=f"bench-{i}").model_dump() for i in range(count)]
+
+
+async def single_inserts(server, collection, docs, concurrency: int):
+    queue = iter(docs)
+
+    async def writer():
+        for doc in queue:
+            await collection.insert_one(doc)
+
+    await asyncio.gather(*(writer() for _ in range(concurrency)))
+
+
+async def write_behind(server, collection, docs, concurrency: int):
+    buffer = server.StatusWriteBuffer(collection, max_batch=500, max_delay=0.05, max_pending=10000)
+    buffer.start()
+    queue = iter(docs)
+
+    async def writer():
+        for doc in queue:
+            await buffer.add(doc)
+
+    await asyncio.gather(*(writer() for _ in range(concurrency)))
+    await buffer.close()
+
+
+async def batched_inserts(server, collection, docs, concurrency: int):
+    for start in range(0, len(docs), 500):
+        await collection.insert_many(docs[start:start + 500], ordered=False)
+
+
+async def main(count: int, concurrency: int):
+    mongo_url = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("MONGO_URL", mongo_url)
+    os.environ.setdefault("DB_NAME", BENCHMARK_DB)
+    import server
+
+    logging.disable(logging.INFO)
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=3000)
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        sys.exit(f"No mongod reachable at {mongo_url}: {e}")
+
+    collection = client[BENCHMARK_DB].status_checks
+    try:
+        for name, strategy in [
+            (f"insert_one x{concurrency}", single_inserts),
+            ("write-behind buffer", write_behind),
+            ("insert_many (500)", batched_inserts),
+        ]:
+            await collection.drop()
+            docs = make_docs(server, count)
+            started = time.perf_counter()
+            await strategy(server, collection, docs, concurrency)
+            elapsed = time.perf_counter() - started
+            stored = await collection.count_documents({})
+            print(f"{name:<22} {count / elapsed:10.0f} inserts/s   ({stored} stored in {elapsed:.2f} s)")
+    finally:
+        await client.drop_database(BENCHMARK_DB)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args.docs, args.concurrency))
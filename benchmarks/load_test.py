@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Offline load test for every /api route.
+
+Runs the app in-process, either through the ASGI transport or behind a real
+uvicorn server on a local port, with the stub Gemini/SendGrid servers and
+the in-memory Mongo stand-in, so it needs no network access and no mongod.
+Each scenario drives one route at a fixed concurrency and reports
+throughput, p50/p95/p99 latency, error count and resident memory.
+
+    python -m benchmarks.load_test                              # print results
+    python -m benchmarks.load_test --server uvicorn --concurrency 50
+    python -m benchmarks.load_test --gemini-latency 1.5 --failure-rate 0.05
+    python -m benchmarks.load_test --save load_baseline.json
+    python -m benchmarks.load_test --compare load_baseline.json   # exit 1 on regression
+
+The stand-in has no indexes, so the status listing gets slower as the
+earlier scenarios fill the collection; pass --mongo-url to run against a
+real MongoDB instead. Baselines are only comparable on the same machine
+and with the same flags.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import httpx
+
+from benchmarks.memory_mongo import MemoryDatabase
+from benchmarks.stubs import StubAPIServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# A scenario slower (p95) or less productive (requests/s) than the baseline
+# by more than this factor counts as a regression; p95 must also have grown
+# by more than the slack, so sub-millisecond jitter doesn't fail the run
+REGRESSION_FACTOR = 1.5
+REGRESSION_SLACK_MS = 2.0
+
+
+@dataclass
+class Scenario:
+    name: str
+    # Builds the request for the i-th call: (method, url, keyword arguments for httpx)
+    build: Callable[[int], tuple]
+    requests: int
+    concurrency: Optional[int] = None
+
+
+def scenarios(scale: float) -> List[Scenario]:
+    """One scenario per /api route, sized so a default run takes a few seconds"""
+    form = {"name": "Load", "email": "load@example.com", "message": "Synthetic load test submission"}
+    run_id = uuid.uuid4().hex[:8]
+
+    def count(n: int) -> int:
+        return max(1, int(n * scale))
+
+    return [
+        Scenario("GET /api/", lambda i: ("GET", "/api/", {}), count(2000)),
+        Scenario(
+            "POST /api/status",
+            lambda i: ("POST", "/api/status", {"json": {"client_name": f"load-{i % 50}"}}),
+            count(2000),
+        ),
+        Scenario(
+            "POST /api/status/batch (100)",
+            lambda i: ("POST", "/api/status/batch", {"json": [{"client_name": f"batch-{i}-{j}"} for j in range(100)]}),
+            count(100),
+        ),
+        Scenario("GET /api/status", lambda i: ("GET", "/api/status", {"params": {"limit": 100}}), count(500)),
+        Scenario(
+            "GET /api/status (ndjson, all rows)",
+            lambda i: ("GET", "/api/status", {"params": {"format": "ndjson"}}),
+            count(20),
+            concurrency=5,
+        ),
+        Scenario(
+            "POST /api/generate-image (hit)",
+            lambda i: ("POST", "/api/generate-image", {"json": {**PREWARMED, "response_format": "url"}}),
+            count(1000),
+        ),
+        Scenario(
+            "POST /api/generate-image (miss)",
+            lambda i: ("POST", "/api/generate-image", {"json": {"section_id": f"load-{run_id}-{i}", "prompt": f"Load test image {run_id} {i}"}}),
+            count(100),
+            concurrency=10,
+        ),
+        Scenario(
+            "POST /api/generate-images (3)",
+            lambda i: ("POST", "/api/generate-images", {"json": [
+                {"section_id": f"batch-{run_id}-{i}-{j}", "prompt": f"Batch image {run_id} {i} {j}", "response_format": "url"}
+                for j in range(3)
+            ]}),
+            count(30),
+            concurrency=10,
+        ),
+        Scenario(
+            "GET /api/generated-image",
+            lambda i: ("GET", f"/api/generated-image/{PREWARMED['section_id']}", {}),
+            count(1000),
+        ),
+        Scenario(
+            "GET /api/generated-image (304)",
+            lambda i: ("GET", f"/api/generated-image/{PREWARMED['section_id']}", {"headers": {"If-None-Match": "*"}}),
+            count(1000),
+        ),
+        Scenario(
+            "GET /api/generated-image (range)",
+            lambda i: ("GET", f"/api/generated-image/{PREWARMED['section_id']}", {"headers": {"Range": "bytes=0-31"}}),
+            count(1000),
+        ),
+        Scenario("GET /api/image-cache/stats", lambda i: ("GET", "/api/image-cache/stats", {}), count(1000)),
+        Scenario("GET /api/ready", lambda i: ("GET", "/api/ready", {}), count(1000)),
+        Scenario("POST /api/send-contact", lambda i: ("POST", "/api/send-contact", {"json": form}), count(500)),
+    ]
+
+
+# Filled in from the server's prewarm manifest once it is imported
+PREWARMED = {}
+
+
+def rss_mb() -> float:
+    """Current resident set size, falling back to the peak where /proc is unavailable"""
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    next_index = iter(range(scenario.requests))
+
+    async def user():
+        nonlocal errors
+        for i in next_index:
+            method, url, kwargs = scenario.build(i)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                # Read streamed bodies to the end so their latency counts
+                await response.aread()
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(scenario.concurrency or concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "rss_mb": rss_mb(),
+    }
+
+
+async def run_in_process(server, concurrency: int, run):
+    """Serve the app through the ASGI transport, with the lifespan run by hand"""
+    async with server.app.router.lifespan_context(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            return await run(client)
+
+
+async def run_uvicorn(server, concurrency: int, run):
+    """Serve the app with uvicorn on a free local port, in this process and event loop"""
+    import uvicorn
+
+    config = uvicorn.Config(server.app, host="127.0.0.1", port=0, log_level="warning", lifespan="on")
+    uvicorn_server = uvicorn.Server(config)
+    serve_task = asyncio.create_task(uvicorn_server.serve())
+    while not uvicorn_server.started:
+        if serve_task.done():
+            serve_task.result()
+        await asyncio.sleep(0.01)
+    port = uvicorn_server.servers[0].sockets[0].getsockname()[1]
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            return await run(client)
+    finally:
+        uvicorn_server.should_exit = True
+        await serve_task
+
+
+async def main(args) -> dict:
+    with StubAPIServer(
+        gemini_latency=args.gemini_latency,
+        sendgrid_latency=args.sendgrid_latency,
+        failure_rate=args.failure_rate,
+    ) as stub:
+        os.environ.update({
+            "MONGO_URL": args.mongo_url or "mongodb://localhost:27017",
+            "DB_NAME": os.getenv("DB_NAME", "loadtest"),
+            "GEMINI_API_KEY": "loadtest",
+            "GEMINI_BASE_URL": stub.url,
+            "SENDGRID_API_KEY": "loadtest",
+            "SENDGRID_BASE_URL": stub.url,
+            "CONTACT_EMAIL": "studio@example.com",
+            "FROM_EMAIL": "noreply@example.com",
+            "IMAGE_STORE_DIR": tempfile.mkdtemp(prefix="loadtest-images-"),
+        })
+        import server
+
+        logging.disable(logging.WARNING)
+        if not args.mongo_url:
+            # The lifespan handler only connects to MONGO_URL when no database is set
+            server.db = MemoryDatabase()
+        PREWARMED.update(server.DEFAULT_PREWARM_MANIFEST[0])
+
+        async def run(client: httpx.AsyncClient) -> dict:
+            # Scenarios that read images expect the startup prewarm to have finished
+            while (await client.get("/api/ready")).status_code != 200:
+                await asyncio.sleep(0.05)
+            results = {}
+            for scenario in scenarios(args.scale):
+                results[scenario.name] = await run_scenario(client, scenario, args.concurrency)
+                print_result(scenario.name, results[scenario.name])
+            return results
+
+        serve = run_uvicorn if args.server == "uvicorn" else run_in_process
+        results = await serve(server, args.concurrency, run)
+        print(f"peak RSS {peak_rss_mb():.1f} MB   stub API calls {stub.requests}")
+        return results
+
+
+def print_result(name: str, result: dict):
+    print(
+        f"{name:<34} {result['requests']:6d} req {result['errors']:5d} err "
+        f"{result['rps']:9.1f}/s   p50 {result['p50_ms']:8.2f}  p95 {result['p95_ms']:8.2f}  "
+        f"p99 {result['p99_ms']:8.2f} ms   RSS {result['rss_mb']:7.1f} MB"
+    )
+
+
+def compare(results: dict, baseline: dict) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]
+        if (result["p95_ms"] > before["p95_ms"] * REGRESSION_FACTOR
+                and result["p95_ms"] - before["p95_ms"] > REGRESSION_SLACK_MS):
+            regressions.append(f"{name}: p95 {result['p95_ms']:.2f} ms vs baseline {before['p95_ms']:.2f} ms")
+        if result["rps"] < before["rps"] / REGRESSION_FACTOR:
+            regressions.append(f"{name}: {result['rps']:.1f}/s vs baseline {before['rps']:.1f}/s")
+        if result["errors"] > before["errors"]:
+            regressions.append(f"{name}: {result['errors']} errors vs baseline {before['errors']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["asgi", "uvicorn"], default="asgi", help="how the app is served")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent clients per scenario")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every scenario's request count")
+    parser.add_argument("--gemini-latency", type=float, default=0.2, help="stub Gemini latency in seconds")
+    parser.add_argument("--sendgrid-latency", type=float, default=0.05, help="stub SendGrid latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of stub API calls that fail")
+    parser.add_argument("--mongo-url", help="use this MongoDB instead of the in-memory stand-in")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="fail if worse than this saved baseline")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2))
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()))
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
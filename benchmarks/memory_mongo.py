@@ -0,0 +1,248 @@
+"""
+In-memory stand-in for the parts of Motor the backend uses.
+
+It supports enough of the query language (equality, $in/$nin, comparisons,
+$exists, $ne, $type, $or/$and), update operators ($set/$inc/$setOnInsert), sorting
+and async cursors to run the app without a mongod, for tests and benchmarks.
+It is not a general Mongo emulator: indexes are recorded but not used.
+"""
+
+import copy
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+
+_MISSING = object()
+
+
+def _compare(op, actual, expected):
+    if actual is _MISSING or actual is None:
+        return False
+    try:
+        return {
+            "$lt": actual < expected,
+            "$lte": actual <= expected,
+            "$gt": actual > expected,
+            "$gte": actual >= expected,
+        }[op]
+    except TypeError:
+        # Mongo never matches across BSON types (e.g. string vs datetime)
+        return False
+
+
+def _matches_condition(actual, condition):
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        for op, expected in condition.items():
+            if op == "$in":
+                ok = (None if actual is _MISSING else actual) in expected
+            elif op == "$nin":
+                ok = (None if actual is _MISSING else actual) not in expected
+            elif op == "$ne":
+                ok = (None if actual is _MISSING else actual) != expected
+            elif op == "$exists":
+                ok = (actual is not _MISSING) == bool(expected)
+            elif op == "$type":
+                ok = actual is not _MISSING and type(actual).__name__ == {"string": "str", "date": "datetime"}[expected]
+            elif op in ("$lt", "$lte", "$gt", "$gte"):
+                ok = _compare(op, actual, expected)
+            else:
+                raise NotImplementedError(f"Unsupported query operator {op}")
+            if not ok:
+                return False
+        return True
+    if condition is None:
+        return actual is _MISSING or actual is None
+    return actual == condition
+
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif not _matches_condition(doc.get(key, _MISSING), condition):
+            return False
+    return True
+
+
+def project(doc, projection):
+    doc = copy.deepcopy(doc)
+    if not projection:
+        return doc
+    included = [key for key, value in projection.items() if value and key != "_id"]
+    if included:
+        result = {key: doc[key] for key in included if key in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    return {key: value for key, value in doc.items() if key not in projection}
+
+
+def _sort_key(field):
+    def key(doc):
+        value = doc.get(field)
+        # None sorts first, like Mongo's null
+        return (value is not None, value)
+    return key
+
+
+def sort_docs(docs, sort):
+    for field, direction in reversed(sort or []):
+        docs = sorted(docs, key=_sort_key(field), reverse=direction < 0)
+    return docs
+
+
+def apply_update(doc, update, inserting=False):
+    for key, value in update.get("$set", {}).items():
+        doc[key] = copy.deepcopy(value)
+    for key, value in update.get("$inc", {}).items():
+        doc[key] = doc.get(key, 0) + value
+    for key in update.get("$unset", {}):
+        doc.pop(key, None)
+    if inserting:
+        for key, value in update.get("$setOnInsert", {}).items():
+            doc[key] = copy.deepcopy(value)
+
+
+class _Result:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class MemoryCursor:
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = []
+        self._limit = 0
+        self._iterator = None
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def _results(self):
+        docs = [doc for doc in self._collection.docs if matches(doc, self._query)]
+        docs = sort_docs(docs, self._sort)
+        if self._limit:
+            docs = docs[:self._limit]
+        # Copy lazily, so iterating a large cursor holds one result at a time
+        return (project(doc, self._projection) for doc in docs)
+
+    async def to_list(self, length=None):
+        results = list(self._results())
+        return results[:length] if length else results
+
+    def __aiter__(self):
+        self._iterator = self._results()
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class MemoryCollection:
+    """Async, in-memory stand-in for a Motor collection"""
+
+    def __init__(self):
+        self.docs = []
+        self.indexes = []
+        self._next_id = 0
+
+    def _insert(self, doc):
+        doc = copy.deepcopy(doc)
+        if "_id" not in doc:
+            self._next_id += 1
+            doc["_id"] = self._next_id
+        self.docs.append(doc)
+        return doc["_id"]
+
+    async def insert_one(self, doc):
+        return _Result(inserted_id=self._insert(doc))
+
+    async def insert_many(self, docs, ordered=True):
+        return _Result(inserted_ids=[self._insert(doc) for doc in docs])
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        docs = sort_docs([doc for doc in self.docs if matches(doc, query or {})], sort)
+        return project(docs[0], projection) if docs else None
+
+    def find(self, query=None, projection=None, **kwargs):
+        return MemoryCursor(self, query or {}, projection)
+
+    async def count_documents(self, query, **kwargs):
+        return sum(1 for doc in self.docs if matches(doc, query))
+
+    async def update_one(self, query, update, upsert=False):
+        for doc in self.docs:
+            if matches(doc, query):
+                apply_update(doc, update)
+                return _Result(matched_count=1, modified_count=1, upserted_id=None)
+        if upsert:
+            doc = {key: value for key, value in query.items() if not key.startswith("$")}
+            apply_update(doc, update, inserting=True)
+            return _Result(matched_count=0, modified_count=0, upserted_id=self._insert(doc))
+        return _Result(matched_count=0, modified_count=0, upserted_id=None)
+
+    async def update_many(self, query, update, upsert=False):
+        matched = [doc for doc in self.docs if matches(doc, query)]
+        for doc in matched:
+            apply_update(doc, update)
+        return _Result(matched_count=len(matched), modified_count=len(matched))
+
+    async def find_one_and_update(self, query, update, projection=None, sort=None,
+                                  return_document=ReturnDocument.BEFORE, upsert=False):
+        docs = sort_docs([doc for doc in self.docs if matches(doc, query)], sort)
+        if not docs:
+            return None
+        doc = docs[0]
+        before = project(doc, projection)
+        apply_update(doc, update)
+        return project(doc, projection) if return_document == ReturnDocument.AFTER else before
+
+    async def delete_many(self, query):
+        kept = [doc for doc in self.docs if not matches(doc, query)]
+        deleted = len(self.docs) - len(kept)
+        self.docs = kept
+        return _Result(deleted_count=deleted)
+
+    async def create_index(self, keys, **kwargs):
+        self.indexes.append((keys, kwargs))
+        return kwargs.get("name", str(keys))
+
+    async def drop_index(self, name):
+        remaining = [index for index in self.indexes if index[1].get("name", str(index[0])) != name]
+        if len(remaining) == len(self.indexes):
+            raise OperationFailure(f"index not found with name [{name}]", code=27)
+        self.indexes = remaining
+
+
+class MemoryDatabase:
+    """Hands out a MemoryCollection per attribute or key, like a Motor database"""
+
+    def __init__(self):
+        self.collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.collections.setdefault(name, MemoryCollection())
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, MemoryCollection())
+
+    async def command(self, *args, **kwargs):
+        return {"ok": 1.0}
@@ -0,0 +1,102 @@
+"""
+Local stand-ins for the Gemini and SendGrid HTTP APIs used by the benchmarks.
+
+Both run on a threaded HTTP/1.1 server with keep-alive, so connection reuse
+by the clients under test is visible in the numbers.
+"""
+
+import base64
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Smallest valid PNG (1x1, transparent)
+STUB_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+
+class StubAPIServer:
+    """Serves Gemini generateContent and SendGrid mail/send on localhost"""
+
+    def __init__(self, gemini_latency: float = 0.0, sendgrid_latency: float = 0.0,
+                 failure_rate: float = 0.0, image: bytes = STUB_PNG):
+        self.gemini_latency = gemini_latency
+        self.sendgrid_latency = sendgrid_latency
+        self.failure_rate = failure_rate
+        self.image = image
+        self.requests = 0
+        self.connections = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # Headers and body are written separately; don't let Nagle hold the body back
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                stub.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.requests += 1
+                if self.path.endswith(":generateContent"):
+                    time.sleep(stub.gemini_latency)
+                    if random.random() < stub.failure_rate:
+                        return self._reply(503, {"error": {"code": 503, "message": "stub failure"}})
+                    return self._reply(200, stub._gemini_body())
+                if self.path == "/v3/mail/send":
+                    time.sleep(stub.sendgrid_latency)
+                    if random.random() < stub.failure_rate:
+                        return self._reply(503, {"errors": [{"message": "stub failure"}]})
+                    return self._reply(202, None)
+                return self._reply(404, {"error": "not found"})
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up (e.g. the app shut down mid-request)
+                    pass
+
+        return Handler
+
+    def _gemini_body(self) -> dict:
+        return {
+            "candidates": [{
+                "content": {
+                    "role": "model",
+                    "parts": [{"inlineData": {"mimeType": "image/png", "data": base64.b64encode(self.image).decode()}}],
+                },
+            }],
+        }
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+from benchmarks.memory_mongo import MemoryCollection, MemoryDatabase  # noqa: E402
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"stub-image-bytes"
+
+
+def gemini_response(data: bytes = PNG_BYTES):
+    """Build an object shaped like a google-genai generate_content response"""
+    part = SimpleNamespace(inline_data=SimpleNamespace(data=data, mime_type="image/png"))
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+
+class StubGeminiClient:
+    """Stand-in for genai.Client that counts aio generate_content calls"""
+
+    def __init__(self, data: bytes = PNG_BYTES, delay: float = 0):
+        self.data = data
+        self.delay = delay
+        self.calls = 0
+        self.models = SimpleNamespace(generate_content=self._generate_content)
+        self.aio = SimpleNamespace(models=self.models)
+
+    async def _generate_content(self, model, contents):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return gemini_response(self.data)
+
+
+class StubSendGrid:
+    """Mock transport for the pooled SendGrid client that records sent messages"""
+
+    def __init__(self, status_code: int = 202):
+        self.status_code = status_code
+        self.sent = []
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/v3/mail/send"
+        self.sent.append(json.loads(request.content))
+        return httpx.Response(self.status_code)
+
+
+@pytest.fixture(autouse=True)
+def fake_db(monkeypatch):
+    database = MemoryDatabase()
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+@pytest.fixture
+def sendgrid(monkeypatch):
+    stub = StubSendGrid()
+    monkeypatch.setenv("CONTACT_EMAIL", "studio@example.com")
+    monkeypatch.setenv("FROM_EMAIL", "noreply@example.com")
+    monkeypatch.setattr(
+        server,
+        "sendgrid_client",
+        httpx.AsyncClient(base_url=server.SENDGRID_BASE_URL, transport=httpx.MockTransport(stub.handle)),
+    )
+    return stub
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    stub = StubGeminiClient()
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(server, "gemini_client", None)
+    monkeypatch.setattr("google.genai.Client", lambda **kwargs: stub)
+    monkeypatch.setattr(server, "gemini_breaker", server.CircuitBreaker(failure_threshold=5, reset_timeout=30))
+    return stub
+
+
+@pytest.fixture(autouse=True)
+def image_cache(monkeypatch, tmp_path):
+    cache = server.ImageCache(
+        max_bytes=1024 * 1024,
+        blob_store=server.ImageBlobStore(tmp_path / "image_store"),
+        collection=MemoryCollection(),
+        alias_collection=MemoryCollection(),
+    )
+    monkeypatch.setattr(server, "generated_images_cache", cache)
+    return cache
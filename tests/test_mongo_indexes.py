@@ -0,0 +1,78 @@
+"""
+Explain-based checks that the hot queries are served by indexes.
+
+These need a real mongod (the in-memory stand-in has no query planner), so
+they run only when MONGO_TEST_URL points at one, e.g.
+
+    MONGO_TEST_URL=mongodb://localhost:27017 python -m pytest tests/test_mongo_indexes.py
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import server
+
+MONGO_TEST_URL = os.getenv("MONGO_TEST_URL")
+
+pytestmark = pytest.mark.skipif(not MONGO_TEST_URL, reason="MONGO_TEST_URL not set")
+
+
+def winning_stages(plan: dict) -> set:
+    """Every stage name in an explain() winning plan"""
+    stages = set()
+    stack = [plan["queryPlanner"]["winningPlan"]]
+    while stack:
+        node = stack.pop()
+        stages.add(node.get("stage"))
+        stack.extend(node.get("inputStages", []))
+        if "inputStage" in node:
+            stack.append(node["inputStage"])
+        if "queryPlan" in node:
+            stack.append(node["queryPlan"])
+    return stages
+
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    client = AsyncIOMotorClient(MONGO_TEST_URL, tz_aware=True)
+    database = client["code_and_canvas_index_test"]
+    monkeypatch.setattr(server, "db", database)
+    yield database
+    asyncio.run(client.drop_database("code_and_canvas_index_test"))
+
+
+def explain_hot_queries(database) -> dict:
+    async def scenario():
+        await server.ensure_indexes()
+        now = datetime.now(timezone.utc)
+        await database.status_checks.insert_many(
+            [{"id": str(i), "client_name": f"client {i}", "timestamp": now + timedelta(seconds=i)} for i in range(50)]
+        )
+        await database.contact_submissions.insert_many(
+            [{"id": str(i), "email": f"lead{i}@example.com", "timestamp": now, "delivery_status": "sent"} for i in range(50)]
+        )
+        status_page = server._decode_status_cursor(server._encode_status_cursor({"timestamp": now, "id": "5"}))
+        return {
+            "status page": await database.status_checks.find(status_page, {"_id": 0})
+            .sort([("timestamp", 1), ("id", 1)]).limit(101).explain(),
+            "status by client": await database.status_checks.find({"client_name": "client 3"}).explain(),
+            "submissions by email": await database.contact_submissions.find({"email": "lead3@example.com"}).explain(),
+            "submissions by date": await database.contact_submissions.find(
+                {"timestamp": {"$gte": now - timedelta(days=1), "$lt": now + timedelta(days=1)}}
+            ).explain(),
+            "outbox claim": await database.contact_submissions.find(server._due_contact_filter(now))
+            .sort([("next_attempt_at", 1)]).explain(),
+        }
+
+    return asyncio.run(scenario())
+
+
+def test_hot_queries_use_indexes(mongo_db):
+    for name, plan in explain_hot_queries(mongo_db).items():
+        stages = winning_stages(plan)
+        assert "COLLSCAN" not in stages, f"{name} scans the collection: {stages}"
+        assert "IXSCAN" in stages, f"{name} does not use an index: {stages}"
@@ -0,0 +1,1103 @@
+import asyncio
+import base64
+import csv
+import hashlib
+import io
+import json
+import logging
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+
+import server
+from benchmarks.memory_mongo import MemoryCollection
+from tests.conftest import PNG_BYTES, gemini_response
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def api_client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test")
+
+
+def test_concurrent_generate_image_calls_share_one_generation(gemini):
+    payload = {"prompt": "a studio", "section_id": "services"}
+
+    async def burst():
+        async with api_client() as client:
+            return await asyncio.gather(*(client.post("/api/generate-image", json=payload) for _ in range(5)))
+
+    responses = run(burst())
+
+    assert [r.status_code for r in responses] == [200] * 5
+    assert gemini.calls == 1
+    assert {r.json()["image_data"] for r in responses} == {base64.b64encode(PNG_BYTES).decode()}
+    assert server._inflight_generations == {}
+
+
+def test_concurrent_generate_image_calls_share_the_error(gemini):
+    async def failing(model, contents):
+        gemini.calls += 1
+        raise RuntimeError("quota exceeded")
+
+    gemini.models.generate_content = failing
+    payload = {"prompt": "a studio", "section_id": "services"}
+
+    async def burst():
+        async with api_client() as client:
+            return await asyncio.gather(*(client.post("/api/generate-image", json=payload) for _ in range(3)))
+
+    responses = run(burst())
+
+    assert [r.status_code for r in responses] == [500] * 3
+    assert gemini.calls == 1
+    assert "quota exceeded" in responses[0].json()["detail"]
+
+
+def test_health_check_latency_stays_flat_during_slow_generations(gemini):
+    gemini.delay = 0.5
+
+    async def scenario():
+        async with api_client() as client:
+            generations = [
+                asyncio.create_task(
+                    client.post("/api/generate-image", json={"prompt": f"theme {i}", "section_id": f"section-{i}"})
+                )
+                for i in range(4)
+            ]
+            await asyncio.sleep(0.05)
+
+            latencies = []
+            for _ in range(5):
+                started = time.perf_counter()
+                response = await client.get("/api/")
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200
+            generated = await asyncio.gather(*generations)
+            return latencies, generated
+
+    latencies, generated = run(scenario())
+
+    assert all(r.status_code == 200 for r in generated)
+    assert gemini.calls == 4
+    assert max(latencies) < 0.1
+
+
+def test_image_cache_evicts_least_recently_used_over_byte_budget(tmp_path):
+    cache = server.ImageCache(max_bytes=10, blob_store=server.ImageBlobStore(tmp_path))
+
+    async def scenario():
+        await cache.set("a", b"aaaa")
+        await cache.set("b", b"bbbb")
+        assert (await cache.get("a")).data == b"aaaa"
+        await cache.set("c", b"cccc")
+        return await cache.get("b")
+
+    assert run(scenario()) is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size_bytes"] == 8
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_image_cache_reads_through_to_the_shared_store(tmp_path):
+    store = MemoryCollection()
+    worker_a = server.ImageCache(max_bytes=1024, blob_store=server.ImageBlobStore(tmp_path / "a"), collection=store)
+    worker_b = server.ImageCache(max_bytes=1024, blob_store=server.ImageBlobStore(tmp_path / "b"), collection=store)
+
+    async def scenario():
+        await worker_a.set("services", PNG_BYTES)
+        return await worker_b.get("services"), await worker_b.get("services")
+
+    first, second = run(scenario())
+
+    assert first.data == second.data == PNG_BYTES
+    assert worker_b.blob_store.read(first.digest) == PNG_BYTES
+    assert worker_b.stats()["store_hits"] == 1
+    assert worker_b.stats()["hits"] == 1
+
+
+def test_blob_store_is_content_addressed(tmp_path):
+    blob_store = server.ImageBlobStore(tmp_path)
+
+    digest = blob_store.put(PNG_BYTES)
+
+    assert blob_store.put(PNG_BYTES) == digest
+    assert blob_store.path(digest).name == f"{digest}.png"
+    assert blob_store.read(digest) == PNG_BYTES
+    assert list(tmp_path.rglob("*.tmp")) == []
+
+
+def test_generated_image_is_served_from_the_blob_store(gemini, image_cache):
+    async def scenario():
+        async with api_client() as client:
+            await client.post("/api/generate-image", json={"prompt": "a studio", "section_id": "services"})
+            image_cache.clear()
+            return await client.get("/api/generated-image/services")
+
+    response = run(scenario())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content == PNG_BYTES
+    # Serving the file did not pull the bytes back into the memory tier
+    assert image_cache.stats()["entries"] == 0
+
+
+def test_image_cache_stats_endpoint(gemini):
+    payload = {"prompt": "a studio", "section_id": "services"}
+
+    async def scenario():
+        async with api_client() as client:
+            await client.post("/api/generate-image", json=payload)
+            await client.post("/api/generate-image", json=payload)
+            return await client.get("/api/image-cache/stats")
+
+    stats = run(scenario()).json()
+
+    assert gemini.calls == 1
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    assert stats["entries"] == 1
+
+
+def test_generated_image_etag_and_conditional_request(gemini):
+    async def scenario():
+        async with api_client() as client:
+            await client.post("/api/generate-image", json={"prompt": "a studio", "section_id": "services"})
+            first = await client.get("/api/generated-image/services")
+            revalidated = await client.get(
+                "/api/generated-image/services", headers={"If-None-Match": first.headers["etag"]}
+            )
+            return first, revalidated
+
+    first, revalidated = run(scenario())
+
+    assert first.headers["etag"] == f'"{hashlib.sha256(PNG_BYTES).hexdigest()}"'
+    assert first.headers["cache-control"] == server.REVALIDATE_CACHE_CONTROL
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == first.headers["etag"]
+
+
+def test_generated_image_serves_byte_ranges(gemini, monkeypatch):
+    monkeypatch.setattr(server, "IMAGE_STREAM_CHUNK_BYTES", 4)
+
+    async def scenario():
+        async with api_client() as client:
+            await client.post("/api/generate-image", json={"prompt": "a studio", "section_id": "services"})
+            url = "/api/generated-image/services"
+            full = await client.get(url)
+            return {
+                "full": full,
+                "head": await client.get(url, headers={"Range": "bytes=0-9"}),
+                "tail": await client.get(url, headers={"Range": "bytes=-5"}),
+                "open": await client.get(url, headers={"Range": "bytes=8-"}),
+                "beyond": await client.get(url, headers={"Range": f"bytes={len(PNG_BYTES)}-"}),
+                "multi": await client.get(url, headers={"Range": "bytes=0-1,4-5"}),
+                "stale_if_range": await client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"other"'}),
+                "if_range": await client.get(url, headers={"Range": "bytes=0-9", "If-Range": full.headers["etag"]}),
+            }
+
+    responses = run(scenario())
+    size = len(PNG_BYTES)
+
+    assert responses["full"].status_code == 200
+    assert responses["full"].headers["accept-ranges"] == "bytes"
+    assert responses["full"].headers["content-length"] == str(size)
+    assert responses["head"].status_code == 206
+    assert responses["head"].content == PNG_BYTES[:10]
+    assert responses["head"].headers["content-range"] == f"bytes 0-9/{size}"
+    assert responses["head"].headers["content-length"] == "10"
+    assert responses["tail"].content == PNG_BYTES[-5:]
+    assert responses["open"].content == PNG_BYTES[8:]
+    assert responses["beyond"].status_code == 416
+    assert responses["beyond"].headers["content-range"] == f"bytes */{size}"
+    assert responses["multi"].status_code == 200
+    assert responses["stale_if_range"].status_code == 200
+    assert responses["stale_if_range"].content == PNG_BYTES
+    assert responses["if_range"].status_code == 206
+
+
+def test_generate_image_url_format_returns_immutable_url(gemini):
+    async def scenario():
+        async with api_client() as client:
+            generated = await client.post(
+                "/api/generate-image",
+                json={"prompt": "a studio", "section_id": "services", "response_format": "url"},
+            )
+            image = await client.get(generated.json()["image_url"])
+            return generated, image
+
+    generated, image = run(scenario())
+
+    assert "image_data" not in generated.json()
+    assert generated.json()["image_url"] == f"/api/generated-image/services?v={hashlib.sha256(PNG_BYTES).hexdigest()}"
+    assert image.content == PNG_BYTES
+    assert image.headers["cache-control"] == server.IMMUTABLE_CACHE_CONTROL
+
+
+def test_generated_image_ignores_malformed_version():
+    async def scenario():
+        async with api_client() as client:
+            return await client.get("/api/generated-image/services", params={"v": "../../etc/passwd"})
+
+    assert run(scenario()).status_code == 404
+
+
+def test_generated_image_serves_negotiated_responsive_variant(image_cache):
+    from io import BytesIO
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new("RGB", (2400, 1200), (80, 40, 120)).save(buffer, format="PNG")
+
+    async def scenario():
+        image = await image_cache.set("services-key", buffer.getvalue())
+        await image_cache.set_alias("services", "services-key")
+        server._transcode_variants(image_cache.blob_store, image.digest)
+        async with api_client() as client:
+            webp = await client.get(
+                "/api/generated-image/services", params={"w": 600}, headers={"Accept": "image/webp,*/*"}
+            )
+            png = await client.get("/api/generated-image/services", headers={"Accept": "*/*"})
+            return webp, png
+
+    webp, png = run(scenario())
+
+    assert webp.headers["content-type"] == "image/webp"
+    assert webp.headers["vary"] == "Accept"
+    assert Image.open(BytesIO(webp.content)).size == (640, 320)
+    assert len(webp.content) < len(png.content)
+    assert png.headers["content-type"] == "image/png"
+    assert webp.headers["etag"] != png.headers["etag"]
+
+
+def test_variant_negotiation_skips_unbuildable_and_refused_formats(monkeypatch):
+    monkeypatch.setattr(server, "_encodable_variant_formats", lambda: ("webp",))
+
+    assert server._negotiate_variant_format("image/avif,image/webp,*/*") == "webp"
+    assert server._negotiate_variant_format("image/avif") is None
+    assert server._negotiate_variant_format("image/webp;q=0, image/png") is None
+    assert server._negotiate_variant_format("image/webp; q=0.5") == "webp"
+
+
+def test_immutable_url_is_not_pinned_to_the_png_before_variants_exist(image_cache, monkeypatch):
+    from io import BytesIO
+    from PIL import Image
+
+    monkeypatch.setattr(server, "_schedule_variant_build", lambda digest: None)
+    buffer = BytesIO()
+    Image.new("RGB", (800, 400), (80, 40, 120)).save(buffer, format="PNG")
+
+    async def scenario():
+        image = await image_cache.set("services-key", buffer.getvalue())
+        url = server._image_url("services", image.digest)
+        async with api_client() as client:
+            before = await client.get(url, headers={"Accept": "image/webp"})
+            server._transcode_variants(image_cache.blob_store, image.digest)
+            after = await client.get(url, headers={"Accept": "image/webp"})
+            return before, after
+
+    before, after = run(scenario())
+
+    assert before.headers["content-type"] == "image/png"
+    assert before.headers["cache-control"] == server.REVALIDATE_CACHE_CONTROL
+    assert after.headers["content-type"] == "image/webp"
+    assert after.headers["cache-control"] == server.IMMUTABLE_CACHE_CONTROL
+
+
+def test_identical_prompts_share_one_image_across_sections(gemini):
+    async def scenario():
+        async with api_client() as client:
+            return await asyncio.gather(
+                client.post("/api/generate-image", json={"prompt": "a studio", "section_id": "services"}),
+                client.post("/api/generate-image", json={"prompt": "a studio", "section_id": "portfolio"}),
+            )
+
+    services, portfolio = run(scenario())
+
+    assert gemini.calls == 1
+    assert services.json()["image_data"] == portfolio.json()["image_data"]
+
+
+def test_prompt_change_invalidates_the_section_alias(gemini, image_cache):
+    async def scenario():
+        async with api_client() as client:
+            await client.post("/api/generate-image", json={"prompt": "a studio", "section_id": "services"})
+            old = await client.get("/api/generated-image/services")
+            gemini.data = PNG_BYTES + b"-v2"
+            await client.post("/api/generate-image", json={"prompt": "a gallery", "section_id": "services"})
+            image_cache.clear()
+            new = await client.get("/api/generated-image/services")
+            return old, new
+
+    old, new = run(scenario())
+
+    assert gemini.calls == 2
+    assert old.content == PNG_BYTES
+    assert new.content == PNG_BYTES + b"-v2"
+
+
+def test_alias_change_reaches_other_workers_after_the_memo_ttl(tmp_path):
+    aliases = MemoryCollection()
+    worker_a = server.ImageCache(1024, server.ImageBlobStore(tmp_path / "a"), alias_collection=aliases)
+    worker_b = server.ImageCache(
+        1024, server.ImageBlobStore(tmp_path / "b"), alias_collection=aliases, alias_ttl_seconds=0.05
+    )
+
+    async def scenario():
+        await worker_a.set_alias("services", "k1")
+        before = await worker_b.resolve_alias("services")
+        await worker_a.set_alias("services", "k2")
+        memoized = await worker_b.resolve_alias("services")
+        await asyncio.sleep(0.1)
+        return before, memoized, await worker_b.resolve_alias("services")
+
+    assert run(scenario()) == ("k1", "k1", "k2")
+
+
+def test_prewarm_generates_only_missing_images_and_reports_readiness(gemini, image_cache, monkeypatch):
+    monkeypatch.setattr(server, "prewarm_status", {"total": 0, "warmed": 0, "failed": [], "done": False})
+    manifest = server.load_prewarm_manifest()
+
+    async def scenario():
+        async with api_client() as client:
+            await client.post("/api/generate-image", json=manifest[0].model_dump())
+            image_cache.clear()
+            before = await client.get("/api/ready")
+            await server.prewarm_images(manifest)
+            after = await client.get("/api/ready")
+            return before, after
+
+    before, after = run(scenario())
+
+    assert before.status_code == 503
+    assert after.status_code == 200
+    assert after.json()["warmed"] == len(manifest)
+    assert gemini.calls == len(manifest)
+
+
+def test_prewarm_manifest_skips_invalid_entries_and_falls_back_on_bad_files(tmp_path, monkeypatch, caplog):
+    manifest_path = tmp_path / "manifest.json"
+    monkeypatch.setenv("IMAGE_PREWARM_MANIFEST", str(manifest_path))
+
+    manifest_path.write_text(json.dumps([{"section_id": "hero"}, {"section_id": "hero", "prompt": "a skyline"}]))
+    with caplog.at_level(logging.ERROR, logger="server"):
+        partial = server.load_prewarm_manifest()
+    manifest_path.write_text(json.dumps({"section_id": "hero", "prompt": "a skyline"}))
+    not_a_list = server.load_prewarm_manifest()
+
+    assert [(entry.section_id, entry.prompt) for entry in partial] == [("hero", "a skyline")]
+    assert "Skipping invalid prewarm manifest entry 0" in caplog.text
+    assert [entry.section_id for entry in not_a_list] == ["services", "portfolio", "benefits"]
+
+
+def test_ready_when_prewarm_is_disabled(monkeypatch):
+    monkeypatch.setattr(server, "prewarm_status", {"total": 0, "warmed": 0, "failed": [], "done": False})
+    monkeypatch.setenv("IMAGE_PREWARM_ENABLED", "false")
+
+    async def scenario():
+        async with server.app.router.lifespan_context(server.app):
+            async with api_client() as client:
+                return await client.get("/api/ready")
+
+    response = run(scenario())
+
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+    assert response.json()["total"] == 0
+
+
+def test_generate_images_streams_results_in_completion_order(gemini):
+    async def slow_for_portfolio(model, contents):
+        gemini.calls += 1
+        if "gallery" in contents:
+            await asyncio.sleep(0.2)
+            raise RuntimeError("quota exceeded")
+        return gemini_response()
+
+    gemini.models.generate_content = slow_for_portfolio
+
+    async def scenario():
+        async with api_client() as client:
+            await client.post("/api/generate-image", json={"prompt": "a studio", "section_id": "services"})
+            return await client.post(
+                "/api/generate-images",
+                json=[
+                    {"prompt": "a gallery", "section_id": "portfolio"},
+                    {"prompt": "a studio", "section_id": "services", "response_format": "url"},
+                    {"prompt": "an office", "section_id": "benefits"},
+                ],
+            )
+
+    response = run(scenario())
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [line["section_id"] for line in lines] == ["services", "benefits", "portfolio"]
+    assert lines[0]["image_url"].startswith("/api/generated-image/services?v=")
+    assert lines[1]["image_data"] == base64.b64encode(PNG_BYTES).decode()
+    assert lines[2]["status_code"] == 500
+    assert gemini.calls == 3
+
+
+def test_generate_images_rejects_oversized_batches(gemini, monkeypatch):
+    monkeypatch.setenv("IMAGE_BATCH_MAX_ITEMS", "2")
+    batch = [{"prompt": f"theme {i}", "section_id": f"section-{i}"} for i in range(3)]
+
+    async def scenario():
+        async with api_client() as client:
+            return await client.post("/api/generate-images", json=batch)
+
+    response = run(scenario())
+
+    assert response.status_code == 413
+    assert gemini.calls == 0
+
+
+def test_gemini_scheduler_starts_queued_generations_by_section_priority(gemini, monkeypatch):
+    monkeypatch.setattr(server, "gemini_scheduler", server.GenerationScheduler(1, 10, retry_after=5))
+    started = []
+
+    async def recording(model, contents):
+        started.append(contents)
+        await asyncio.sleep(0.05)
+        return gemini_response()
+
+    gemini.models.generate_content = recording
+
+    async def scenario():
+        async with api_client() as client:
+            requests = []
+            for section_id in ["footer", "benefits", "portfolio", "services"]:
+                payload = {"prompt": f"image for {section_id}", "section_id": section_id}
+                requests.append(asyncio.create_task(client.post("/api/generate-image", json=payload)))
+                await asyncio.sleep(0.01)
+            return await asyncio.gather(*requests)
+
+    responses = run(scenario())
+
+    assert [r.status_code for r in responses] == [200] * 4
+    order = [next(s for s in ["footer", "benefits", "portfolio", "services"] if s in c) for c in started]
+    assert order == ["footer", "services", "portfolio", "benefits"]
+    assert server.gemini_scheduler.active == 0
+
+
+def test_gemini_scheduler_rejects_when_queue_is_full(gemini, monkeypatch):
+    monkeypatch.setattr(server, "gemini_scheduler", server.GenerationScheduler(1, 1, retry_after=7))
+    gemini.delay = 0.1
+
+    async def burst():
+        async with api_client() as client:
+            return await asyncio.gather(*(
+                client.post("/api/generate-image", json={"prompt": f"prompt {i}", "section_id": f"s{i}"})
+                for i in range(3)
+            ))
+
+    responses = run(burst())
+
+    assert sorted(r.status_code for r in responses) == [200, 200, 503]
+    rejected = next(r for r in responses if r.status_code == 503)
+    assert rejected.headers["retry-after"] == "7"
+    assert rejected.json()["code"] == "at_capacity"
+    assert gemini.calls == 2
+    assert server.gemini_scheduler.rejected == 1
+    assert server.gemini_scheduler.depth == 0
+
+
+def test_gemini_call_deadline_returns_504(gemini, monkeypatch):
+    monkeypatch.setattr(server, "GEMINI_DEADLINE_SECONDS", 0.05)
+    gemini.delay = 1
+
+    async def scenario():
+        async with api_client() as client:
+            started = time.perf_counter()
+            response = await client.post("/api/generate-image", json={"prompt": "a studio", "section_id": "services"})
+            return response, time.perf_counter() - started
+
+    response, elapsed = run(scenario())
+
+    assert response.status_code == 504
+    assert elapsed < 0.5
+    assert server.gemini_breaker.failures == 1
+
+
+def test_circuit_breaker_fails_fast_then_probes_for_recovery(gemini, monkeypatch):
+    monkeypatch.setattr(server, "gemini_breaker", server.CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+    healthy = gemini.models.generate_content
+
+    async def failing(model, contents):
+        gemini.calls += 1
+        raise RuntimeError("service unavailable")
+
+    gemini.models.generate_content = failing
+
+    async def generate(client, i):
+        return await client.post("/api/generate-image", json={"prompt": f"prompt {i}", "section_id": f"s{i}"})
+
+    async def scenario():
+        async with api_client() as client:
+            failures = [await generate(client, i) for i in range(2)]
+            refused = await generate(client, 2)
+            calls_while_open = gemini.calls
+            await asyncio.sleep(0.25)
+            gemini.models.generate_content = healthy
+            probe = await generate(client, 3)
+            return failures, refused, calls_while_open, probe
+
+    failures, refused, calls_while_open, probe = run(scenario())
+
+    assert [r.status_code for r in failures] == [500, 500]
+    assert refused.status_code == 503
+    assert refused.headers["retry-after"] == "1"
+    assert calls_while_open == 2
+    assert probe.status_code == 200
+    assert server.gemini_breaker.state == "closed"
+    assert server.gemini_breaker.opens == 1
+
+
+def test_failed_generation_serves_the_sections_previous_image(gemini, monkeypatch):
+    monkeypatch.setattr(server, "gemini_breaker", server.CircuitBreaker(failure_threshold=1, reset_timeout=30))
+
+    async def scenario():
+        async with api_client() as client:
+            await client.post("/api/generate-image", json={"prompt": "a studio", "section_id": "services"})
+            gemini.models.generate_content = failing
+            failed = await client.post("/api/generate-image", json={"prompt": "a new studio", "section_id": "services"})
+            # The breaker is open now: no Gemini call at all
+            refused = await client.post(
+                "/api/generate-image",
+                json={"prompt": "a newer studio", "section_id": "services", "response_format": "url"},
+            )
+            other = await client.post("/api/generate-image", json={"prompt": "an office", "section_id": "benefits"})
+            return failed, refused, other
+
+    async def failing(model, contents):
+        gemini.calls += 1
+        raise RuntimeError("service unavailable")
+
+    failed, refused, other = run(scenario())
+
+    assert failed.status_code == 200
+    assert failed.json() == {"section_id": "services", "image_data": base64.b64encode(PNG_BYTES).decode(), "stale": True}
+    assert refused.status_code == 200
+    assert refused.json()["stale"] is True
+    assert refused.json()["image_url"].startswith("/api/generated-image/services?v=")
+    assert other.status_code == 503
+    assert other.json()["code"] == "provider_unavailable"
+    assert gemini.calls == 2
+
+
+def test_expired_image_is_served_while_it_regenerates(gemini, image_cache):
+    image_cache.ttl_seconds = 0.05
+    request = {"prompt": "a studio", "section_id": "services"}
+
+    async def scenario():
+        async with api_client() as client:
+            await client.post("/api/generate-image", json=request)
+            await asyncio.sleep(0.1)
+            gemini.data = PNG_BYTES + b"-v2"
+            gemini.delay = 0.1
+            during = [await client.post("/api/generate-image", json=request) for _ in range(3)]
+            await asyncio.gather(*server._inflight_generations.values())
+            after = await client.post("/api/generate-image", json=request)
+            return during, after
+
+    during, after = run(scenario())
+
+    assert [response.json()["image_data"] for response in during] == [base64.b64encode(PNG_BYTES).decode()] * 3
+    assert after.json()["image_data"] == base64.b64encode(PNG_BYTES + b"-v2").decode()
+    assert gemini.calls == 2
+    assert image_cache.stats()["expired_hits"] == 3
+
+
+def test_failed_refresh_is_not_retried_on_every_expired_hit(gemini, image_cache, monkeypatch):
+    monkeypatch.setattr(server, "_failed_refreshes", {})
+    image_cache.ttl_seconds = 0.05
+    request = {"prompt": "a studio", "section_id": "services"}
+
+    async def filtered(model, contents):
+        gemini.calls += 1
+        return SimpleNamespace(candidates=[])
+
+    async def scenario():
+        async with api_client() as client:
+            await client.post("/api/generate-image", json=request)
+            await asyncio.sleep(0.1)
+            gemini.models.generate_content = filtered
+            responses = []
+            for _ in range(5):
+                responses.append(await client.post("/api/generate-image", json=request))
+                await asyncio.gather(*server._inflight_generations.values(), return_exceptions=True)
+            return responses
+
+    responses = run(scenario())
+
+    assert [response.status_code for response in responses] == [200] * 5
+    assert gemini.calls == 2
+    assert server.gemini_breaker.state == "closed"
+
+
+def test_expired_hits_recheck_the_shared_store_at_most_once_per_interval(tmp_path, monkeypatch):
+    store = MemoryCollection()
+    worker_a = server.ImageCache(1024, server.ImageBlobStore(tmp_path / "a"), collection=store, ttl_seconds=0.05)
+    worker_b = server.ImageCache(1024, server.ImageBlobStore(tmp_path / "b"), collection=store, ttl_seconds=0.05)
+    lookups = []
+    find_one = store.find_one
+
+    async def counting_find_one(*args, **kwargs):
+        lookups.append(args[0])
+        return await find_one(*args, **kwargs)
+
+    async def scenario():
+        await worker_b.set("services", PNG_BYTES)
+        await asyncio.sleep(0.1)
+        monkeypatch.setattr(store, "find_one", counting_find_one)
+        stale = [await worker_b.get("services") for _ in range(5)]
+        # Another worker refreshes it; worker b picks it up at the next re-check
+        await worker_a.set("services", PNG_BYTES + b"-v2")
+        worker_b.recheck_seconds = 0
+        return stale, await worker_b.get("services")
+
+    stale, fresh = run(scenario())
+
+    assert [image.data for image in stale] == [PNG_BYTES] * 5
+    assert fresh.data == PNG_BYTES + b"-v2"
+    assert len([lookup for lookup in lookups if "key" in lookup]) == 3
+    assert worker_b.stats()["expired_hits"] == 5
+
+
+def test_next_refresh_window_handles_windows_past_midnight(monkeypatch):
+    monkeypatch.setattr(server, "IMAGE_REFRESH_WINDOW", (22, 4))
+    day = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+    assert server._next_refresh_window(day.replace(hour=2)) == (day - timedelta(hours=2), day + timedelta(hours=4))
+    assert server._next_refresh_window(day.replace(hour=12)) == (day + timedelta(hours=22), day + timedelta(hours=28))
+
+
+def test_off_peak_refresh_regenerates_only_images_expiring_soon(gemini, image_cache):
+    manifest = server.load_prewarm_manifest()
+
+    async def scenario():
+        image_cache.ttl_seconds = 3600
+        await server._get_or_generate_image(manifest[0].section_id, manifest[0].prompt)
+        image_cache.ttl_seconds = 3 * 24 * 3600
+        await server._get_or_generate_image(manifest[1].section_id, manifest[1].prompt)
+        gemini.calls = 0
+        return await server.refresh_section_images(manifest, until=datetime.now(timezone.utc) + timedelta(days=1))
+
+    refreshed = run(scenario())
+
+    # The first image expires within the day and the last was never generated
+    assert refreshed == 2
+    assert gemini.calls == 2
+
+
+CONTACT_FORM = {"name": "Ada", "email": "ada@example.com", "message": "I would like a landing page."}
+
+
+def test_send_contact_queues_submission_without_calling_sendgrid(sendgrid, fake_db):
+    async def scenario():
+        async with api_client() as client:
+            return await client.post("/api/send-contact", json=CONTACT_FORM)
+
+    response = run(scenario())
+    [submission] = fake_db.contact_submissions.docs
+
+    assert response.status_code == 200
+    assert response.json()["success"] is True
+    assert sendgrid.sent == []
+    assert submission["delivery_status"] == "pending"
+    assert submission["email_sent"] is False
+
+
+def test_contact_delivery_records_success(sendgrid, fake_db):
+    async def scenario():
+        async with api_client() as client:
+            await client.post("/api/send-contact", json=CONTACT_FORM)
+        [submission] = fake_db.contact_submissions.docs
+        await server.deliver_contact_submissions([dict(submission)])
+
+    run(scenario())
+    [submission] = fake_db.contact_submissions.docs
+
+    assert len(sendgrid.sent) == 1
+    assert submission["delivery_status"] == "sent"
+    assert submission["email_sent"] is True
+    assert submission["attempts"] == 1
+
+
+def test_contact_delivery_backs_off_then_gives_up(sendgrid, fake_db, monkeypatch):
+    sendgrid.status_code = 500
+    monkeypatch.setattr(server, "CONTACT_DELIVERY_MAX_ATTEMPTS", 2)
+
+    async def scenario():
+        async with api_client() as client:
+            await client.post("/api/send-contact", json=CONTACT_FORM)
+        [submission] = fake_db.contact_submissions.docs
+        await server.deliver_contact_submissions([dict(submission)])
+        first = dict(fake_db.contact_submissions.docs[0])
+        await server.deliver_contact_submissions([dict(first)])
+        return first
+
+    first = run(scenario())
+    [final] = fake_db.contact_submissions.docs
+
+    assert first["delivery_status"] == "retrying"
+    assert first["next_attempt_at"] > first["timestamp"]
+    assert "status 500" in first["last_error"]
+    assert final["delivery_status"] == "failed"
+    assert final["attempts"] == 2
+    assert final["email_sent"] is False
+
+
+def test_contact_digest_worker_batches_a_burst(sendgrid, fake_db, monkeypatch):
+    monkeypatch.setattr(server, "_contact_outbox_wakeup", asyncio.Event())
+    monkeypatch.setattr(server, "CONTACT_DIGEST_WINDOW_SECONDS", 0.1)
+    monkeypatch.setattr(server, "CONTACT_DIGEST_MAX", 4)
+
+    async def scenario():
+        worker = asyncio.create_task(server.contact_digest_worker())
+        async with api_client() as client:
+            await asyncio.gather(*(client.post("/api/send-contact", json=CONTACT_FORM) for _ in range(10)))
+        for _ in range(100):
+            if all(doc["delivery_status"] == "sent" for doc in fake_db.contact_submissions.docs):
+                break
+            await asyncio.sleep(0.02)
+        worker.cancel()
+
+    run(scenario())
+
+    assert len(fake_db.contact_submissions.docs) == 10
+    assert all(doc["email_sent"] for doc in fake_db.contact_submissions.docs)
+    assert len(sendgrid.sent) == 3
+    assert sendgrid.sent[0]["subject"] == "4 new contact form submissions"
+
+
+def test_contact_delivery_worker_survives_a_failed_delivery(sendgrid, fake_db, monkeypatch):
+    monkeypatch.setattr(server, "_contact_outbox_wakeup", asyncio.Event())
+    deliver = server.deliver_contact_submissions
+    failures = []
+
+    async def flaky_deliver(submissions):
+        if not failures:
+            failures.append(submissions[0]["id"])
+            raise RuntimeError("update_many failed")
+        await deliver(submissions)
+
+    monkeypatch.setattr(server, "deliver_contact_submissions", flaky_deliver)
+
+    async def scenario():
+        worker = asyncio.create_task(server.contact_delivery_worker())
+        async with api_client() as client:
+            await client.post("/api/send-contact", json=CONTACT_FORM)
+            await client.post("/api/send-contact", json=CONTACT_FORM)
+        for _ in range(100):
+            if any(doc["delivery_status"] == "sent" for doc in fake_db.contact_submissions.docs):
+                break
+            await asyncio.sleep(0.02)
+        worker.cancel()
+        return worker
+
+    worker = run(scenario())
+    statuses = {doc["id"]: doc["delivery_status"] for doc in fake_db.contact_submissions.docs}
+
+    assert worker.cancelled()
+    # The failed one keeps its lease until it expires; the next one still goes out
+    assert statuses.pop(failures[0]) == "sending"
+    assert list(statuses.values()) == ["sent"]
+
+
+def test_contact_delivery_worker_stops_when_cancelled_during_wakeup(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "_contact_outbox_wakeup", asyncio.Event())
+
+    async def scenario():
+        worker = asyncio.create_task(server.contact_delivery_worker())
+        await asyncio.sleep(0.05)
+        # A submission arriving just as shutdown cancels the worker
+        server._contact_outbox_wakeup.set()
+        worker.cancel()
+        await asyncio.wait_for(asyncio.gather(worker, return_exceptions=True), 1)
+        return worker
+
+    assert run(scenario()).cancelled()
+
+
+def test_status_checks_paginate_by_timestamp_and_id(fake_db):
+    same_instant = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    fake_db.status_checks.docs.extend(
+        {"id": f"check-{i}", "client_name": f"client {i}", "timestamp": same_instant + timedelta(seconds=i // 2)}
+        for i in range(5)
+    )
+
+    async def scenario():
+        pages, cursor = [], None
+        async with api_client() as client:
+            while True:
+                params = {"limit": 2, **({"after": cursor} if cursor else {})}
+                response = await client.get("/api/status", params=params)
+                pages.append([check["id"] for check in response.json()])
+                cursor = response.headers.get("x-next-cursor")
+                if cursor is None:
+                    return pages
+
+    pages = run(scenario())
+
+    assert pages == [["check-0", "check-1"], ["check-2", "check-3"], ["check-4"]]
+
+
+def test_status_checks_stream_as_ndjson(fake_db):
+    async def scenario():
+        async with api_client() as client:
+            for name in ("a", "b", "c"):
+                await client.post("/api/status", json={"client_name": name})
+            return await client.get("/api/status", params={"format": "ndjson"})
+
+    response = run(scenario())
+    rows = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [row["client_name"] for row in rows] == ["a", "b", "c"]
+    assert isinstance(fake_db.status_checks.docs[0]["timestamp"], datetime)
+    assert datetime.fromisoformat(rows[0]["timestamp"]).tzinfo is not None
+
+
+def test_legacy_string_timestamps_are_migrated(fake_db):
+    fake_db.status_checks.docs.append(
+        {"_id": 1, "id": "legacy", "client_name": "old", "timestamp": "2025-06-01T12:00:00+00:00"}
+    )
+
+    migrated = run(server.migrate_status_check_timestamps())
+
+    assert migrated == 1
+    assert fake_db.status_checks.docs[0]["timestamp"] == datetime(2025, 6, 1, 12, tzinfo=timezone.utc)
+    assert run(server.migrate_status_check_timestamps()) == 0
+
+
+def test_status_pages_after_startup_over_legacy_timestamps(fake_db, monkeypatch, caplog):
+    monkeypatch.setenv("IMAGE_PREWARM_ENABLED", "false")
+    fake_db.status_checks.docs.extend(
+        {"_id": i, "id": f"legacy-{i}", "client_name": "old", "timestamp": f"2025-06-0{i}T12:00:00+00:00"}
+        for i in range(1, 4)
+    )
+    fake_db.status_checks.docs.append({"_id": 4, "id": "garbled", "client_name": "old", "timestamp": "yesterday"})
+
+    async def scenario():
+        pages = []
+        async with server.app.router.lifespan_context(server.app):
+            async with api_client() as client:
+                params = {"limit": 1}
+                while True:
+                    response = await client.get("/api/status", params=params)
+                    assert response.status_code == 200
+                    pages.append(response.json())
+                    if "x-next-cursor" not in response.headers:
+                        return pages
+                    params["after"] = response.headers["x-next-cursor"]
+
+    with caplog.at_level(logging.WARNING, logger="server"):
+        pages = run(scenario())
+
+    assert [check["id"] for page in pages for check in page] == ["legacy-1", "legacy-2", "legacy-3"]
+    assert "Skipping document 4 with unparseable timestamp 'yesterday'" in caplog.text
+
+
+def test_status_batch_inserts_in_one_call(fake_db):
+    async def scenario():
+        async with api_client() as client:
+            return await client.post("/api/status/batch", json=[{"client_name": f"c{i}"} for i in range(3)])
+
+    response = run(scenario())
+
+    assert response.status_code == 200
+    assert [check["client_name"] for check in response.json()] == ["c0", "c1", "c2"]
+    assert len(fake_db.status_checks.docs) == 3
+
+
+def test_status_write_buffer_groups_inserts_and_flushes_on_close():
+    collection = MemoryCollection()
+    batches = []
+    insert_many = collection.insert_many
+
+    async def recording_insert_many(docs, ordered=True):
+        batches.append(len(docs))
+        return await insert_many(docs, ordered=ordered)
+
+    collection.insert_many = recording_insert_many
+    buffer = server.StatusWriteBuffer(collection, max_batch=4, max_delay=10, max_pending=2)
+
+    async def scenario():
+        buffer.start()
+        for i in range(10):
+            await buffer.add({"id": str(i)})
+        await buffer.close()
+
+    run(scenario())
+
+    assert batches == [4, 4, 2]
+    assert [doc["id"] for doc in collection.docs] == [str(i) for i in range(10)]
+
+
+def test_ensure_indexes_declares_status_check_ttl(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "STATUS_CHECK_TTL_SECONDS", 86400)
+
+    run(server.ensure_indexes())
+    run(server.ensure_indexes())
+
+    ttl_indexes = [options for _, options in fake_db.status_checks.indexes if "expireAfterSeconds" in options]
+    assert ttl_indexes[-1] == {"name": server.STATUS_CHECK_TTL_INDEX, "expireAfterSeconds": 86400}
+    assert ("email", {}) in fake_db.contact_submissions.indexes
+
+
+def test_metrics_endpoint_reports_routes_cache_and_dependencies(gemini):
+    async def scenario():
+        async with api_client() as client:
+            await client.post("/api/generate-image", json={"prompt": "a studio", "section_id": "services"})
+            await client.get("/api/generated-image/services")
+            await client.get("/api/no-such-route")
+            return await client.get("/metrics")
+
+    response = run(scenario())
+    body = response.text
+
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="POST",route="/api/generate-image",status="200"}' in body
+    assert 'route="/api/generated-image/{section_id}"' in body
+    assert 'route="unmatched"' in body
+    assert "gemini_generate_content_duration_seconds_count" in body
+    assert "image_cache_misses_total 1.0" in body
+    assert "image_cache_entries 1.0" in body
+
+
+def test_generate_image_reports_stage_timings(gemini, caplog):
+    async def scenario():
+        async with api_client() as client:
+            miss = await client.post("/api/generate-image", json={"prompt": "a studio", "section_id": "services"})
+            hit = await client.post("/api/generate-image", json={"prompt": "a studio", "section_id": "services"})
+            return miss, hit
+
+    with caplog.at_level(logging.INFO, logger="server.trace"):
+        miss, hit = run(scenario())
+
+    miss_stages = [timing.split(";")[0] for timing in miss.headers["server-timing"].split(", ")]
+    assert miss_stages == ["prompt", "cache", "gemini", "store", "generation", "encode", "serialize", "total"]
+    assert "gemini" not in hit.headers["server-timing"]
+    assert all(re.fullmatch(r"\w+;dur=\d+\.\d{3}", timing) for timing in hit.headers["server-timing"].split(", "))
+
+    traces = [json.loads(record.message) for record in caplog.records if record.name == "server.trace"]
+    assert [(trace["path"], trace["status"]) for trace in traces] == [("/api/generate-image", 200)] * 2
+    assert set(traces[0]["spans_ms"]) == set(miss_stages) - {"total"}
+
+
+def test_admin_profile_requires_token_and_returns_folded_stacks(monkeypatch):
+    async def scenario():
+        async with api_client() as client:
+            disabled = await client.get("/api/admin/profile", params={"seconds": 0.05})
+            monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+            unauthorized = await client.get("/api/admin/profile", params={"seconds": 0.05})
+            profile = await client.get(
+                "/api/admin/profile",
+                params={"seconds": 0.2, "interval_ms": 5},
+                headers={"Authorization": "Bearer s3cret"},
+            )
+            return disabled, unauthorized, profile
+
+    disabled, unauthorized, profile = run(scenario())
+
+    assert disabled.status_code == 404
+    assert unauthorized.status_code == 401
+    assert profile.status_code == 200
+    lines = profile.text.splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert stack.startswith("MainThread;")
+        assert int(count) >= 1
+
+
+def test_contact_export_streams_a_date_range_as_csv_and_ndjson(fake_db, monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(server, "CONTACT_EXPORT_BATCH_SIZE", 2)
+    day = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    fake_db.contact_submissions.docs = [
+        {"id": str(i), "name": f"Lead {i}", "email": f"lead{i}@example.com", "message": "Hi, a quote?",
+         "timestamp": day + timedelta(hours=i), "delivery_status": "sent", "email_sent": True, "attempts": 1}
+        for i in reversed(range(6))
+    ]
+    fake_db.contact_submissions.docs[0]["message"] = "=HYPERLINK(\"http://evil\")"
+    headers = {"Authorization": "Bearer s3cret"}
+    window = {"since": "2024-05-01T01:00:00", "until": "2024-05-01T05:00:00Z"}
+
+    async def scenario():
+        async with api_client() as client:
+            unauthorized = await client.get("/api/admin/contact-submissions/export")
+            as_csv = await client.get("/api/admin/contact-submissions/export", params=window, headers=headers)
+            as_ndjson = await client.get(
+                "/api/admin/contact-submissions/export", params={**window, "format": "ndjson"}, headers=headers
+            )
+            everything = await client.get(
+                "/api/admin/contact-submissions/export", params={"format": "ndjson"}, headers=headers
+            )
+            backwards = await client.get(
+                "/api/admin/contact-submissions/export", params={"since": window["until"], "until": window["since"]},
+                headers=headers,
+            )
+            return unauthorized, as_csv, as_ndjson, everything, backwards
+
+    unauthorized, as_csv, as_ndjson, everything, backwards = run(scenario())
+
+    assert unauthorized.status_code == 401
+    assert as_csv.headers["content-type"].startswith("text/csv")
+    assert as_csv.headers["content-disposition"] == 'attachment; filename="contact-submissions.csv"'
+    rows = list(csv.DictReader(io.StringIO(as_csv.text)))
+    assert [row["id"] for row in rows] == ["1", "2", "3", "4"]
+    assert rows[0] == {
+        "id": "1", "timestamp": "2024-05-01T01:00:00+00:00", "name": "Lead 1", "email": "lead1@example.com",
+        "message": "Hi, a quote?", "delivery_status": "sent", "email_sent": "True", "attempts": "1",
+    }
+    assert [json.loads(line)["id"] for line in as_ndjson.text.splitlines()] == ["1", "2", "3", "4"]
+    assert json.loads(as_ndjson.text.splitlines()[0])["timestamp"] == "2024-05-01T01:00:00Z"
+    last = json.loads(everything.text.splitlines()[-1])
+    assert last["id"] == "5" and last["message"] == "=HYPERLINK(\"http://evil\")"
+    assert backwards.status_code == 400
+
+
+def test_contact_export_neutralises_spreadsheet_formulas():
+    assert server._csv_safe("=SUM(A1:A2)") == "'=SUM(A1:A2)"
+    assert server._csv_safe("@cmd") == "'@cmd"
+    assert server._csv_safe("Hello") == "Hello"
+    assert server._csv_safe(3) == 3
+
+
+def test_legacy_contact_submissions_are_migrated_into_exports(fake_db, monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    fake_db.contact_submissions.docs = [
+        {"_id": 1, "id": "dated", "name": "New", "email": "new@example.com", "message": "Hello there!",
+         "timestamp": datetime(2024, 5, 2, tzinfo=timezone.utc)},
+        {"_id": 2, "id": "legacy", "name": "Old", "email": "old@example.com", "message": "Hello there!",
+         "timestamp": "2024-05-01T12:00:00", "email_sent": True},
+    ]
+
+    async def scenario():
+        migrated = await server.migrate_contact_submission_timestamps()
+        async with api_client() as client:
+            export = await client.get(
+                "/api/admin/contact-submissions/export",
+                params={"format": "ndjson", "since": "2024-05-01T00:00:00Z"},
+                headers={"Authorization": "Bearer s3cret"},
+            )
+        return migrated, export
+
+    migrated, export = run(scenario())
+    rows = [json.loads(line) for line in export.text.splitlines()]
+
+    assert migrated == 1
+    assert [row["id"] for row in rows] == ["legacy", "dated"]
+    assert rows[0]["timestamp"] == "2024-05-01T12:00:00Z"
+    assert run(server.migrate_contact_submission_timestamps()) == 0
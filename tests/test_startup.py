@@ -0,0 +1,19 @@
+"""
+Cold-start budget for server.py, measured in fresh interpreters.
+
+Budgets default to generous values for shared CI runners; tighten them with
+STARTUP_IMPORT_BUDGET_SECONDS / STARTUP_FIRST_RESPONSE_BUDGET_SECONDS.
+"""
+
+from benchmarks import bench_startup
+
+
+def test_import_stays_lazy_and_within_budget():
+    total, modules = bench_startup.measure_import()
+
+    assert [name for name in bench_startup.LAZY_MODULES if name in modules] == []
+    assert total < bench_startup.IMPORT_BUDGET_SECONDS
+
+
+def test_first_response_within_budget():
+    assert bench_startup.measure_first_response() < bench_startup.FIRST_RESPONSE_BUDGET_SECONDS